@@ -0,0 +1,23 @@
+import tempfile
+import timeit
+import kurapy as kp
+
+
+def build(L, cache):
+    lattice = kp.Lattice(L)
+    lattice.set_distances('cartesian', cache=cache)
+    return kp.coupling.cosine(lattice, cache=cache)
+
+
+# a fresh Cache per call stands in for a new worker process: the in-process LRU starts empty
+directory = tempfile.mkdtemp()
+print('{:>5} {:>7} {:>12} {:>15} {:>12} {:>9}'.format('L', 'N', 'build [ms]', 'from disk [ms]', 'in LRU [ms]', 'speedup'))
+for L in [20, 40, 60]:
+    cache = kp.cache.Cache(directory)
+    t_build = min(timeit.repeat(lambda: build(L, None), number=1, repeat=3))
+    build(L, cache)
+    t_disk = min(timeit.repeat(lambda: build(L, kp.cache.Cache(directory)), number=1, repeat=3))
+    t_lru = min(timeit.repeat(lambda: build(L, cache), number=1, repeat=3))
+    print('{:>5} {:>7} {:>12.1f} {:>15.2f} {:>12.3f} {:>9.0f}'.format(
+        L, L ** 2, 1e3 * t_build, 1e3 * t_disk, 1e3 * t_lru, t_build / t_disk))
+kp.cache.Cache(directory).clear()
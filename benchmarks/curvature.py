@@ -0,0 +1,44 @@
+import timeit
+import tracemalloc
+import numpy as np
+import kurapy as kp
+
+
+def stacked_curvature(phimat):
+    # Reference comparing all three images [pp - 2 pi, pp, pp + 2 pi], as analyze.curvature did before
+    laplace = np.zeros(np.shape(phimat))
+    for ax in [1, 2]:
+        dl = np.zeros(np.shape(phimat))
+        for push in [np.roll(phimat, -1, axis=ax), np.roll(phimat, 1, axis=ax)]:
+            pp = push - phimat
+            dphi = np.array([pp - 2 * np.pi, pp, pp + 2 * np.pi])
+            dmin = np.amin(np.abs(dphi), axis=0)
+            dphi[np.around(np.abs(dphi), decimals=4) != np.around(dmin, decimals=4)] = 0
+            dl += np.sum(dphi, axis=0)
+        laplace += np.abs(dl)
+    return laplace / (4 * np.pi)
+
+
+def peak(fn):
+    tracemalloc.start()
+    fn()
+    _, top = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return top
+
+
+np.random.seed(0)
+print('{:>5} {:>6} {:>10} {:>13} {:>13} {:>13} {:>13} {:>7}'.format(
+    'L', 'T', 'in [MB]', 'stack [ms]', 'chunked [ms]', 'stack [MB]', 'chunked [MB]', 'equal'))
+for L, T in [(20, 400), (50, 1000), (100, 1000)]:
+    phimat = 2 * np.pi * np.random.rand(T, L, L)
+    out = np.empty_like(phimat)
+
+    t_stack = min(timeit.repeat(lambda: stacked_curvature(phimat), number=1, repeat=3))
+    t_chunk = min(timeit.repeat(lambda: kp.analyze.curvature(phimat, out=out), number=1, repeat=3))
+    # peak memory on top of the input, the chunked version writing into a preallocated output
+    m_stack = peak(lambda: stacked_curvature(phimat))
+    m_chunk = peak(lambda: kp.analyze.curvature(phimat, out=out))
+    equal = np.array_equal(stacked_curvature(phimat), kp.analyze.curvature(phimat))
+    print('{:>5} {:>6} {:>10.1f} {:>13.1f} {:>13.1f} {:>13.1f} {:>13.1f} {:>7}'.format(
+        L, T, phimat.nbytes / 2 ** 20, 1e3 * t_stack, 1e3 * t_chunk, m_stack / 2 ** 20, m_chunk / 2 ** 20, str(equal)))
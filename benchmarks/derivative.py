@@ -0,0 +1,58 @@
+import timeit
+import numpy as np
+import kurapy as kp
+
+
+def outer_interaction(K, phi, shift=0):
+    # Reference N x N outer-product evaluation used before the matrix-vector engine
+    return np.sum(K * np.sin(np.subtract.outer(phi, phi) + shift), axis=0) / len(phi)
+
+
+np.random.seed(0)
+repeat = 5
+print('{:>5} {:>7} {:>14} {:>14} {:>9} {:>10}'.format('L', 'N', 'outer [ms]', 'matvec [ms]', 'speedup', 'max err'))
+for L in [5, 10, 20, 40, 60]:
+    N = L ** 2
+    lattice = kp.Lattice(L)
+    lattice.set_distances('cartesian')
+    K = kp.coupling.cosine(lattice)
+    model = kp.Model(np.zeros(N), K, shift=0.5)
+    phi = 2 * np.pi * np.random.rand(N)
+
+    t_outer = min(timeit.repeat(lambda: outer_interaction(K, phi, 0.5), number=1, repeat=repeat))
+    t_matvec = min(timeit.repeat(lambda: model.interaction(phi), number=1, repeat=repeat))
+    err = np.max(np.abs(outer_interaction(K, phi, 0.5) - model.interaction(phi)))
+    print('{:>5} {:>7} {:>14.3f} {:>14.3f} {:>9.1f} {:>10.2e}'.format(
+        L, N, 1e3 * t_outer, 1e3 * t_matvec, t_outer / t_matvec, err))
+
+# Full trajectory comparison against the reference right-hand side
+L = 20
+N = L ** 2
+lattice = kp.Lattice(L)
+lattice.set_distances('cartesian')
+K = kp.coupling.cosine(lattice)
+model = kp.Model(np.zeros(N), K, shift=0.5)
+t = np.arange(200)
+phi0 = 2 * np.pi * np.random.rand(N)
+
+start = timeit.default_timer()
+phis = model.evolve(t, phi0)
+t_new = timeit.default_timer() - start
+
+
+def reference(phi, out=None, work=None):
+    # the Stepper evaluates in place and ignores the return value
+    if out is None:
+        out = np.empty_like(phi)
+    out[...] = outer_interaction(K, phi, 0.5)
+    return out
+
+
+model.interaction = reference
+start = timeit.default_timer()
+phis_ref = model.evolve(t, phi0)
+t_ref = timeit.default_timer() - start
+
+diff = np.abs((phis - phis_ref + np.pi) % (2 * np.pi) - np.pi)
+print('\nrk4, L={}, {} steps: outer {:.2f} s, matvec {:.2f} s, max phase difference {:.2e}'.format(
+    L, len(t), t_ref, t_new, np.max(diff)))
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import timeit
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import kurapy as kp
+
+
+def figure_frames(phimat):
+    # Reference drawing every frame through the figure of lattice_anim, as its ffmpeg writer does
+    fig, ax = plt.subplots()
+    plot = ax.matshow(phimat[0], cmap='hsv', interpolation='None')
+    plot.set_clim([0, 2 * np.pi])
+    fig.colorbar(plot)
+    for phi in phimat:
+        plot.set_data(phi % (2 * np.pi))
+        fig.canvas.draw()
+        np.asarray(fig.canvas.buffer_rgba())
+    plt.close(fig)
+
+
+def lut_frames(phimat):
+    lut = kp.visualize._lut('hsv')
+    for start in range(0, len(phimat), 16):
+        kp.visualize._rgb(phimat[start:start + 16], lut, (0, 2 * np.pi), True, 1)
+
+
+np.random.seed(0)
+directory = tempfile.mkdtemp()
+print('{:>5} {:>6} {:>15} {:>15} {:>9} {:>15}'.format('L', 'T', 'figure [ms/f]', 'lookup [ms/f]', 'speedup', 'png seq [ms/f]'))
+for L, T in [(50, 200), (100, 200), (200, 100)]:
+    # a memmapped trajectory, as written by sinks.Npy
+    filename = os.path.join(directory, 'phis.npy')
+    np.save(filename, 2 * np.pi * np.random.rand(T, L * L))
+    phimat = kp.analyze.shape_matrix(np.load(filename, mmap_mode='r'))
+
+    t_figure = min(timeit.repeat(lambda: figure_frames(phimat[:20]), number=1, repeat=3)) / 20
+    t_lut = min(timeit.repeat(lambda: lut_frames(phimat), number=1, repeat=3)) / T
+    t_png = min(timeit.repeat(lambda: kp.visualize.lattice_export(phimat, os.path.join(directory, '{:05d}.png')),
+                              number=1, repeat=3)) / T
+    print('{:>5} {:>6} {:>15.2f} {:>15.3f} {:>9.0f} {:>15.2f}'.format(
+        L, T, 1e3 * t_figure, 1e3 * t_lut, t_figure / t_lut, 1e3 * t_png))
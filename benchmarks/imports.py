@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+# fresh interpreters, so that nothing is cached between the measurements
+statements = [
+    ('numpy', 'import numpy'),
+    ('kurapy', 'import kurapy'),
+    ('kurapy.Model', 'import kurapy; kurapy.Model'),
+    ('kurapy.coupling', 'import kurapy; kurapy.coupling'),
+    ('kurapy.sample', 'import kurapy; kurapy.sample'),
+    ('kurapy.analyze', 'import kurapy; kurapy.analyze'),
+    ('kurapy.visualize', 'import kurapy; kurapy.visualize'),
+]
+heavy = ['scipy', 'cv2', 'matplotlib']
+
+
+def measure(statement, repeat=5):
+    probe = ('import sys, time; t = time.perf_counter(); {}; t = time.perf_counter() - t; '
+             'print(t, *[m for m in {!r} if m in sys.modules])').format(statement, heavy)
+    runs = [subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout.split()
+            for _ in range(repeat)]
+    return min(float(r[0]) for r in runs), runs[0][1:]
+
+
+print('{:>18} {:>11} {:>24}'.format('statement', 'time [ms]', 'heavy modules loaded'))
+results = {}
+for name, statement in statements:
+    elapsed, loaded = measure(statement)
+    results[name] = loaded
+    print('{:>18} {:>11.1f} {:>24}'.format(name, 1e3 * elapsed, ', '.join(loaded) or '-'))
+
+# importing the package and the model must not pull in any heavy dependency
+for name in ['kurapy', 'kurapy.Model']:
+    if results[name]:
+        sys.exit('{} imports {}'.format(name, ', '.join(results[name])))
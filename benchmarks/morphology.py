@@ -0,0 +1,54 @@
+import timeit
+import numpy as np
+import scipy.ndimage as nd
+import cv2
+import kurapy as kp
+
+
+def framewise_centroid(laplace, init_pos):
+    # Reference looping over frames with cv2 and scipy.ndimage, as analyze.spiral_centroid did before
+    binimg = (laplace > 0.05).view(np.uint8)
+    yd, xd = np.where(binimg[0])
+    core_dist = (init_pos[0] - xd) ** 2 + (init_pos[1] - yd) ** 2
+    mask = (min(core_dist) == core_dist)
+    pos = [xd[mask][0], yd[mask][0]]
+    centroid = np.zeros((len(binimg), 2))
+    kernel = np.ones((3, 3))
+    for i in range(len(binimg)):
+        morphed = cv2.dilate(binimg[i], kernel, iterations=1)
+        morphed = cv2.morphologyEx(morphed, cv2.MORPH_CLOSE, kernel)
+        cores, _ = nd.label(morphed, structure=kernel)
+        yc, xc = np.where(cores == cores[pos[1], pos[0]])
+        centroid[i] = [np.mean(xc), np.mean(yc)]
+        pos = [int(centroid[i, 0]), int(centroid[i, 1])]
+    return centroid
+
+
+def framewise_closing(laplace):
+    binimg = (laplace > 0.05).view(np.uint8)
+    kernel = np.ones((3, 3))
+    return np.array([cv2.morphologyEx(b, cv2.MORPH_CLOSE, kernel) for b in binimg])
+
+
+def spiral(L, T):
+    # rotating spiral whose core circles around the centre of the lattice
+    t = np.arange(T)[:, np.newaxis, np.newaxis]
+    y, x = np.mgrid[0:L, 0:L]
+    dx, dy = x - L / 2 - L / 5 * np.cos(t / 50), y - L / 2 - L / 5 * np.sin(t / 50)
+    return (np.arctan2(dy, dx) + 0.5 * np.hypot(dx, dy)) % (2 * np.pi)
+
+
+if __name__ == '__main__':
+    print('{:>5} {:>6} {:>16} {:>16} {:>9} {:>16} {:>16} {:>9}'.format(
+        'L', 'T', 'close loop [ms]', 'close stack [ms]', 'speedup', 'centroid loop', 'centroid stack', 'speedup'))
+    for L, T in [(20, 20000), (50, 5000), (100, 2000)]:
+        laplace = kp.analyze.curvature(spiral(L, T))
+        init = tuple(np.argwhere(laplace[0] > 0.05)[0][::-1])
+
+        t_loop = min(timeit.repeat(lambda: framewise_closing(laplace), number=1, repeat=3))
+        t_stack = min(timeit.repeat(lambda: kp.analyze._morph(laplace > 0.05, 'de', False), number=1, repeat=3))
+        c_loop = min(timeit.repeat(lambda: framewise_centroid(laplace, init), number=1, repeat=3))
+        c_stack = min(timeit.repeat(lambda: kp.analyze.spiral_centroid(laplace, init, periodic=False), number=1,
+                                    repeat=3))
+        print('{:>5} {:>6} {:>16.1f} {:>16.1f} {:>9.1f} {:>16.1f} {:>16.1f} {:>9.1f}'.format(
+            L, T, 1e3 * t_loop, 1e3 * t_stack, t_loop / t_stack, 1e3 * c_loop, 1e3 * c_stack, c_loop / c_stack))
@@ -0,0 +1,61 @@
+import timeit
+import numpy as np
+import kurapy as kp
+
+
+def wrapped(a, b):
+    # circular phase difference in [0, pi]
+    return np.abs(np.angle(np.exp(1j * (np.asarray(a, dtype=float) - b))))
+
+
+def basic(dtype):
+    lattice = kp.Lattice(5)
+    lattice.set_distances('cartesian', dtype=dtype)
+    w = kp.sample.cauchy(spread=0.3, size=lattice.N)
+    return kp.Model(w, kp.coupling.constant(lattice)), np.arange(0, 200, 0.1), {}
+
+
+def curvature(dtype):
+    lattice = kp.Lattice(20)
+    lattice.set_distances('cartesian', dtype=dtype)
+    return kp.Model(np.zeros(lattice.N), kp.coupling.cosine(lattice)), np.arange(200), {}
+
+
+def gradient(dtype):
+    lattice = kp.Lattice(20)
+    lattice.set_distances('cartesian', dtype=dtype)
+    control = np.zeros((20, 20))
+    control[13, 13] = control[13, 14] = control[14, 13] = control[14, 14] = 1
+    return kp.Model(np.zeros(lattice.N), kp.coupling.cosine(lattice), shift=0.5, control=control), np.arange(400), {}
+
+
+def noisy(dtype):
+    # stochastic Heun with a seeded Generator, over many noise blocks; float32 draws a different
+    # normal stream, so the phases only agree statistically
+    lattice = kp.Lattice(10)
+    lattice.set_distances('cartesian', dtype=dtype)
+    model = kp.Model(np.zeros(lattice.N), kp.coupling.cosine(lattice), noise=0.1)
+    return model, np.arange(0, 100, 0.1), {'method': 'heun', 'rng': 0}
+
+
+# the bundled examples, integrated with the same frequencies and initial phases in both precisions
+print('{:>10} {:>8} {:>13} {:>13} {:>12} {:>11} {:>9}'.format(
+    'example', 'dtype', 'K+phis [kB]', 'time [ms]', 'max dphi', 'max dR', 'curv. px'))
+for example in [basic, curvature, gradient, noisy]:
+    runs = {}
+    for dtype in [np.float64, np.float32]:
+        np.random.seed(0)
+        model, t, options = example(dtype)
+        phi0 = 2 * np.pi * np.random.rand(model._N)
+        phis = model.evolve(t, phi0, **options)
+        elapsed = min(timeit.repeat(lambda: model.evolve(t, phi0, **options), number=1, repeat=3))
+        laplace = kp.analyze.curvature(kp.analyze.shape_matrix(phis)) if model._N > 25 else None
+        runs[dtype] = phis, kp.analyze.global_op(phis)[0], laplace
+        memory = (model._coupling.nbytes + phis.nbytes) / 1024
+
+        ref, R_ref, laplace_ref = runs[np.float64]
+        dphi, dR = np.max(wrapped(phis, ref)), np.max(np.abs(runs[dtype][1] - R_ref))
+        # sites classified differently as spiral core, the threshold used by analyze.gradient
+        px = 'n/a' if laplace is None else '{:d}'.format(np.sum((laplace > 0.05) != (laplace_ref > 0.05)))
+        print('{:>10} {:>8} {:>13.1f} {:>13.1f} {:>12.2e} {:>11.2e} {:>9}'.format(
+            example.__name__, np.dtype(dtype).name, memory, 1e3 * elapsed, dphi, dR, px))
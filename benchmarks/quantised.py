@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import timeit
+import numpy as np
+import kurapy as kp
+
+
+def disk(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def wrapped(a, b):
+    return np.max(np.abs(np.angle(np.exp(1j * (a - b)))))
+
+
+np.random.seed(0)
+directory = tempfile.mkdtemp()
+L = 30
+lattice = kp.Lattice(L)
+lattice.set_distances('cartesian')
+model = kp.Model(kp.sample.cauchy(spread=0.1, size=L ** 2), kp.coupling.cosine(lattice))
+t = np.arange(0, 500, 0.5)
+phi0 = 2 * np.pi * np.random.rand(L ** 2)
+ref = model.evolve(t, phi0)
+laplace = kp.analyze.curvature(kp.analyze.shape_matrix(ref))
+
+print('{:>18} {:>10} {:>10} {:>13} {:>11} {:>10} {:>9}'.format(
+    'format', 'disk [MB]', 'ratio', 'curv. [ms]', 'max dphi', 'max dR', 'curv. px'))
+sinks = [('npy float64', lambda: kp.sinks.Npy(os.path.join(directory, 'phis.npy'))),
+         ('quantised', lambda: kp.sinks.Quantised(os.path.join(directory, 'q'))),
+         ('quantised zlib', lambda: kp.sinks.Quantised(os.path.join(directory, 'qz'), compress=True))]
+for name, sink in sinks:
+    sink = sink()
+    model.evolve(t, phi0, sink=sink)
+    # a fresh reader, as when an archived run is analysed again
+    if isinstance(sink, kp.sinks.Quantised):
+        phis = kp.sinks.Trajectory(sink.filename)
+        phimat = phis.matrix()
+    else:
+        phis = np.load(sink.filename, mmap_mode='r')
+        phimat = kp.analyze.shape_matrix(phis)
+    elapsed = min(timeit.repeat(lambda: kp.analyze.curvature(phimat), number=1, repeat=3))
+    lq = kp.analyze.curvature(phimat)
+    size = disk(sink.filename)
+    print('{:>18} {:>10.2f} {:>10.3f} {:>13.1f} {:>11.1e} {:>10.1e} {:>9d}'.format(
+        name, size / 2 ** 20, size / ref.nbytes, 1e3 * elapsed, wrapped(phis[:], ref),
+        np.max(np.abs(kp.analyze.global_op(phis)[0] - kp.analyze.global_op(ref)[0])),
+        np.sum((lq > 0.05) != (laplace > 0.05))))
+shutil.rmtree(directory)
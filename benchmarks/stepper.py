@@ -0,0 +1,37 @@
+import timeit
+import numpy as np
+import kurapy as kp
+
+
+def allocating_rk4(model, freq, phi, dt, steps, noise):
+    # Reference loop allocating every stage, as Model.evolve did before the Stepper
+    def dpdt(phi):
+        return freq + model.interaction(phi) + np.random.normal(0, noise * np.pi, size=np.shape(phi))
+
+    for _ in range(steps):
+        k1 = dpdt(phi)
+        k2 = dpdt(phi + 0.5 * dt * k1)
+        k3 = dpdt(phi + 0.5 * dt * k2)
+        k4 = dpdt(phi + dt * k3)
+        phi = (phi + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)) % (2 * np.pi)
+    return phi
+
+
+np.random.seed(0)
+steps = 200
+print('{:>5} {:>7} {:>6} {:>16} {:>16} {:>9}'.format('L', 'N', 'noise', 'loop [us/step]', 'stepper [us/step]', 'speedup'))
+for L in [5, 10, 20, 50, 100]:
+    N = L ** 2
+    lattice = kp.Lattice(L)
+    lattice.set_distances('cartesian', mode='lazy')
+    K = kp.coupling.cosine(lattice, form='lowrank') if L > 40 else kp.coupling.cosine(lattice)
+    for noise in [0, 0.01]:
+        freq = np.zeros(N)
+        model = kp.Model(freq, K, noise=noise)
+        phi0 = 2 * np.pi * np.random.rand(N)
+        stepper = kp.Stepper(model, phi0, 0.1, rng=np.random.default_rng(0))
+
+        t_loop = min(timeit.repeat(lambda: allocating_rk4(model, freq, phi0, 0.1, steps, noise), number=1, repeat=3))
+        t_step = min(timeit.repeat(lambda: stepper.run(steps), number=1, repeat=3))
+        print('{:>5} {:>7} {:>6} {:>16.1f} {:>16.1f} {:>9.2f}'.format(
+            L, N, noise, 1e6 * t_loop / steps, 1e6 * t_step / steps, t_loop / t_step))
@@ -0,0 +1,202 @@
+"""
+Wall time and peak memory of the simulation and analysis hot paths, parameterised over the lattice size L,
+integration method, noise and control. Runs offline with NumPy only besides kurapy's own dependencies.
+
+    python benchmarks/suite.py                          # all benchmarks, printed as a table
+    python benchmarks/suite.py -k evolve --quick        # only names containing 'evolve', smallest sizes
+    python benchmarks/suite.py -o new.json --compare old.json   # save, and flag regressions against a release
+    python benchmarks/suite.py --plot scaling.png       # log-log time against N with fitted exponents
+"""
+import argparse
+import itertools
+import json
+import platform
+import sys
+import timeit
+import tracemalloc
+import numpy as np
+import kurapy as kp
+from morphology import spiral
+
+sizes = [8, 16, 24, 32]  # dense N x N tables at L=32 hold 1M entries
+
+
+def lattice(L, mode='dense'):
+    lat = kp.Lattice(L)
+    lat.set_distances('cartesian', mode=mode)
+    return lat
+
+
+def distances(L, mode):
+    # setting the distances and reading them in blocks of rows as the coupling builders do,
+    # which is where lazy distances are computed
+    lat = kp.Lattice(L)
+    step = max(1, 2 ** 18 // L ** 2)
+
+    def run():
+        lat.set_distances('cartesian', mode=mode)
+        for i in range(0, L ** 2, step):
+            lat.block(slice(i, i + step))
+    return run
+
+
+def coupling(L, builder, form):
+    lat = lattice(L, 'dense' if form in ['dense', 'sparse'] else 'table')
+    return lambda: getattr(kp.coupling, builder)(lat, form=form)
+
+
+def evolve(L, method, noise, control):
+    np.random.seed(0)
+    mask = None
+    if control:
+        # a 2 x 2 block of pinned sites in the middle of the lattice
+        mask = np.zeros((L, L))
+        mask[L // 2 - 1:L // 2 + 1, L // 2 - 1:L // 2 + 1] = 1
+    second_order = 0.1 if method == 'verlet' else 0
+    model = kp.Model(np.zeros(L ** 2), kp.coupling.cosine(lattice(L)), noise=noise, control=mask,
+                     second_order=second_order)
+    phi0 = 2 * np.pi * np.random.rand(L ** 2)
+    return lambda: model.evolve(np.arange(0, 20, 0.1), phi0, method=method, rng=0)
+
+
+def curvature(L):
+    phimat = spiral(L, 100)
+    return lambda: kp.analyze.curvature(phimat)
+
+
+def gradient(L):
+    phimat = spiral(L, 100)
+    return lambda: kp.analyze.gradient(phimat)
+
+
+def spiral_centroid(L):
+    laplace = kp.analyze.curvature(spiral(L, 100))
+    return lambda: kp.analyze.spiral_centroid(laplace, (L // 2, L // 2))
+
+
+def track_cores(L):
+    laplace = kp.analyze.curvature(spiral(L, 100))
+    return lambda: kp.analyze.track_cores(laplace, threads=1)
+
+
+# name: (setup, parameters besides L); evolve covers methods with and without noise and control
+benchmarks = {
+    'distances': (distances, {'mode': ['dense', 'lazy', 'table']}),
+    'coupling': (coupling, [{'builder': ['constant', 'cosine', 'cosine2'], 'form': ['dense', 'kernel', 'lowrank']},
+                            {'builder': ['neighbour'], 'form': ['dense', 'sparse']}]),
+    'evolve': (evolve, [{'method': ['forward_euler', 'rk4', 'dopri5', 'verlet'], 'noise': [0], 'control': [False]},
+                        {'method': ['rk4'], 'noise': [0], 'control': [True]},
+                        {'method': ['euler_maruyama', 'heun'], 'noise': [0.01], 'control': [False, True]}]),
+    'curvature': (curvature, {}),
+    'gradient': (gradient, {}),
+    'spiral_centroid': (spiral_centroid, {}),
+    'track_cores': (track_cores, {}),
+}
+
+
+def cases(name, L_list):
+    setup, grids = benchmarks[name]
+    for grid in grids if isinstance(grids, list) else [grids]:
+        for values in itertools.product(L_list, *grid.values()):
+            yield setup, dict(zip(['L'] + list(grid), values))
+
+
+def measure(fn, repeat):
+    # best wall time of repeat calls after a warm-up call, and the peak memory traced during one call
+    fn()
+    elapsed = min(timeit.repeat(fn, number=1, repeat=repeat))
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def label(result):
+    return ' '.join('{}={}'.format(k, v) for k, v in result['params'].items())
+
+
+def key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def plot(results, filename):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    names = list(dict.fromkeys(r['name'] for r in results))
+    cols = min(len(names), 4)
+    rows = -(-len(names) // cols)
+    fig, axes = plt.subplots(rows, cols, figsize=(5 * cols, 4 * rows), squeeze=False)
+    for ax in axes.flat[len(names):]:
+        ax.set_visible(False)
+    for ax, name in zip(axes.flat, names):
+        series = {}
+        for r in results:
+            if r['name'] == name:
+                rest = {k: v for k, v in r['params'].items() if k != 'L'}
+                series.setdefault(' '.join('{}'.format(v) for v in rest.values()), []).append(r)
+        for legend, rs in series.items():
+            N = np.array([r['params']['L'] ** 2 for r in rs])
+            time = np.array([r['time'] for r in rs])
+            # the fitted exponent of N over the two largest sizes shows O(N^2) behaviour as a slope of 2
+            slope = np.polyfit(np.log(N[-2:]), np.log(time[-2:]), 1)[0] if len(N) > 1 else np.nan
+            ax.loglog(N, time, 'o-', label='{} ({:.1f})'.format(legend or name, slope))
+        ax.set_title(name)
+        ax.set_xlabel('N')
+        ax.set_ylabel('time [s]')
+        ax.legend(fontsize=7)
+    fig.tight_layout()
+    fig.savefig(filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-k', default='', help='run the benchmarks whose name contains this')
+    parser.add_argument('--sizes', type=int, nargs='+', default=sizes, help='lattice sizes L')
+    parser.add_argument('--quick', action='store_true', help='only the two smallest sizes, one repeat')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-o', '--output', help='save the results as JSON')
+    parser.add_argument('--compare', help='JSON results of an earlier run to flag regressions against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown counted as regression')
+    parser.add_argument('--plot', help='save scaling plots to this image file')
+    args = parser.parse_args()
+    L_list = sorted(args.sizes)[:2] if args.quick else sorted(args.sizes)
+    repeat = 1 if args.quick else args.repeat
+
+    results = []
+    print('{:>16} {:<50} {:>11} {:>11}'.format('benchmark', 'parameters', 'time [ms]', 'peak [MB]'))
+    for name in benchmarks:
+        if args.k not in name:
+            continue
+        for setup, params in cases(name, L_list):
+            elapsed, peak = measure(setup(**params), repeat)
+            results.append({'name': name, 'params': params, 'time': elapsed, 'peak': peak})
+            print('{:>16} {:<50} {:>11.2f} {:>11.2f}'.format(name, label(results[-1]), 1e3 * elapsed, peak / 2 ** 20))
+
+    if args.output:
+        meta = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.platform()}
+        with open(args.output, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=1)
+    if args.plot:
+        plot(results, args.plot)
+    if args.compare:
+        with open(args.compare) as f:
+            before = {key(r): r for r in json.load(f)['results']}
+        regressions = 0
+        print('\n{:>16} {:<50} {:>11} {:>11}'.format('regression', 'parameters', 'time x', 'peak x'))
+        for r in results:
+            old = before.get(key(r))
+            if old is None:
+                continue
+            time, peak = r['time'] / old['time'], r['peak'] / max(old['peak'], 1)
+            if time > 1 + args.threshold or peak > 1 + args.threshold:
+                regressions += 1
+                print('{:>16} {:<50} {:>11.2f} {:>11.2f}'.format(r['name'], label(r), time, peak))
+        if regressions:
+            sys.exit('{} regressions beyond {:.0%}'.format(regressions, args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+import timeit
+import numpy as np
+import kurapy as kp
+
+
+def spirals(L, T):
+    # four spirals of alternating charge, each core circling around its own site
+    t = np.arange(T)[:, np.newaxis, np.newaxis]
+    y, x = np.mgrid[0:L, 0:L]
+    phimat = np.zeros((T, L, L))
+    for k, (cx, cy, charge) in enumerate([(1, 1, 1), (3, 1, -1), (1, 3, -1), (3, 3, 1)]):
+        dx, dy = x - cx * L / 4 - L / 50 * np.cos(t / 20 + k), y - cy * L / 4 - L / 50 * np.sin(t / 20 + k)
+        phimat += charge * np.arctan2(dy, dx)
+    return phimat % (2 * np.pi)
+
+
+# spiral_centroid labels whole frames for one core, track_cores follows all four within windows
+print('{:>5} {:>6} {:>14} {:>14} {:>9} {:>7}'.format('L', 'T', 'centroid [ms]', 'tracks [ms]', 'speedup', 'cores'))
+for L, T in [(128, 400), (256, 200), (512, 100)]:
+    laplace = kp.analyze.curvature(spirals(L, T))
+    init = (L // 4, L // 4)
+
+    t_full = min(timeit.repeat(lambda: kp.analyze.spiral_centroid(laplace, init, periodic=False), number=1, repeat=3))
+    t_track = min(timeit.repeat(lambda: kp.analyze.track_cores(laplace, periodic=False), number=1, repeat=3))
+    cores = kp.analyze.track_cores(laplace, periodic=False)[0].shape[1]
+    print('{:>5} {:>6} {:>14.1f} {:>14.1f} {:>9.1f} {:>7}'.format(
+        L, T, 1e3 * t_full, 1e3 * t_track, t_full / t_track, cores))
@@ -1,6 +1,19 @@
+import importlib
 from .lattice import Lattice
 from .model import Model
-from . import analyze
-from . import coupling
-from . import sample
-from . import visualize
+from .ensemble import Ensemble
+from .stepper import Stepper
+
+# submodules are imported on first access, so that simulations need NumPy only and
+# scipy, cv2 and matplotlib are loaded once analyze, coupling, sample or visualize are used
+_submodules = ['analyze', 'cache', 'coupling', 'monitor', 'observers', 'sample', 'sinks', 'stepper', 'sweep', 'visualize']
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules))
@@ -1,12 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
 import numpy as np
-import scipy.ndimage as nd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 import cv2
 
 
-def shape_matrix(phi):
-    shape = phi.shape
-    dd = int(np.sqrt(shape[-1]))
-    phimat = phi.reshape((shape[0], dd, dd)).transpose((0, 2, 1))
+def shape_matrix(phi, shape=None):
+    # shape: (rows, cols) of a rectangular grid, square by default
+    if shape is None:
+        dd = int(np.sqrt(phi.shape[-1]))
+        shape = (dd, dd)
+    phimat = phi.reshape((phi.shape[0],) + tuple(shape)).transpose((0, 2, 1))
     return phimat
 
 
@@ -16,52 +21,207 @@ def shape_linear(phimat):
     return phi
 
 
-def global_op(phi):
-    # Global Order Parameter
-    z = np.sum(np.exp(1j * phi), axis=1) / len(phi[0])
+def global_op(phi, chunk=1024):
+    # Global Order Parameter; frames are read in chunks, so memmaps and sinks.Trajectory stay on disk
+    z = np.concatenate([np.sum(np.exp(1j * np.asarray(phi[i:i + chunk])), axis=1)
+                        for i in range(0, len(phi), chunk)]) / np.shape(phi)[1]
     R = np.abs(z)
     PSI = np.angle(z) % (2 * np.pi)
     return R, PSI
 
 
-def local_op(phimat):
-    cmat = np.exp(1j * phimat)
-    push_u = np.roll(cmat, -1, axis=1)
-    push_d = np.roll(cmat, 1, axis=1)
-    push_l = np.roll(cmat, -1, axis=2)
-    push_r = np.roll(cmat, 1, axis=2)
-
-    z = np.mean([cmat, push_u, push_d, push_l, push_r], axis=0)
-    R = np.abs(z)
-    PSI = np.angle(z) % (2 * np.pi)
+def local_op(phimat, chunk=64):
+    # reduced one chunk of frames at a time into real outputs, float32 phases stay single precision
+    R = np.empty(np.shape(phimat), dtype=np.result_type(phimat.dtype, np.float32))
+    PSI = np.empty_like(R)
+    for i in range(0, len(phimat), chunk):
+        cmat = np.exp(1j * np.asarray(phimat[i:i + chunk]))
+        push_u = np.roll(cmat, -1, axis=1)
+        push_d = np.roll(cmat, 1, axis=1)
+        push_l = np.roll(cmat, -1, axis=2)
+        push_r = np.roll(cmat, 1, axis=2)
+        z = np.mean([cmat, push_u, push_d, push_l, push_r], axis=0)
+        R[i:i + chunk] = np.abs(z)
+        PSI[i:i + chunk] = np.angle(z) % (2 * np.pi)
     return R, PSI
 
 
-def curvature(phimat):
-    phimat_curv = np.copy(phimat)
+def _wrapped(d):
+    # minimal-image phase difference d - 2 pi k; a difference within rounding of pi also
+    # counts its other image, so that both cancel as in a comparison of all three images
+    k = np.rint(d / (2 * np.pi))
+    w = d - 2 * np.pi * k
+    alt = d - 2 * np.pi * (k + np.sign(w))
+    tie = np.around(np.abs(w), decimals=4) == np.around(np.abs(alt), decimals=4)
+    w[tie] += alt[tie]
+    return w
+
+
+def curvature(phimat, out=None, chunk=64):
+    """
+    Magnitude of the discrete Laplacian of the phases along each axis, from wrapped differences
+    to the 4 neighbours. Frames are processed in chunks, so trajectories larger than memory
+    can be read from and written to memmaps.
+    :param phimat: (T x rows x cols) phases
+    :param out: (T x rows x cols) array or memmap receiving the curvature, allocated if None
+    :param chunk: (int) frames processed at once
+    :return: (T x rows x cols) curvature
+    """
+    if out is None:
+        out = np.empty(np.shape(phimat), dtype=np.result_type(phimat.dtype, np.float32))
+    for i in range(0, len(phimat), chunk):
+        phi = np.asarray(phimat[i:i + chunk])
+        laplace = 0
+        for ax in [1, 2]:
+            dl = _wrapped(np.roll(phi, -1, axis=ax) - phi)  # up/left
+            dl += _wrapped(np.roll(phi, 1, axis=ax) - phi)  # down/right
+            laplace = laplace + np.abs(dl)
+        out[i:i + chunk] = laplace / (4 * np.pi)
+    return out
+
+
+_chunk_bytes = 2 ** 18  # frames of the morphology processed together, so they stay in cache
+_frame_pixels = 2 ** 13  # frames from this size on are morphed one at a time on a non-periodic lattice
+
+
+def _chunked(fn, T, chunk, threads):
+    # fn(start, stop) over chunks of chunk frames out of T, spread across threads
+    threads = threads or os.cpu_count()
+    chunk = max(1, chunk)
+    bounds = [(i, min(i + chunk, T)) for i in range(0, T, chunk)]
+    if threads == 1 or len(bounds) == 1:
+        return [fn(*b) for b in bounds]
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(lambda b: fn(*b), bounds))
+
+
+def _morph_stack(binimg, ops, periodic, out=None):
+    # 3 x 3 binary dilations ('d') and erosions ('e') of every frame of a (T x rows x cols) stack,
+    # each as a single cv2 call on the frames stacked with a one pixel border. The border wraps
+    # around a periodic lattice, otherwise it neither grows nor erodes pixels, as cv2 does per frame
+    T, rows, cols = binimg.shape
+    img = np.zeros((T, rows + 2, cols + 2), dtype=np.uint8)
+    img[:, 1:-1, 1:-1] = binimg
+    kernel = np.ones((3, 3), dtype=np.uint8)
+    for op in ops:
+        if periodic:
+            img[:, 0, 1:-1], img[:, -1, 1:-1] = img[:, -2, 1:-1], img[:, 1, 1:-1]
+            img[:, :, 0], img[:, :, -1] = img[:, :, -2], img[:, :, 1]
+        else:
+            img[:, [0, -1], :] = op == 'e'
+            img[:, :, [0, -1]] = op == 'e'
+        flat = img.reshape(-1, cols + 2)
+        flat[...] = cv2.dilate(flat, kernel) if op == 'd' else cv2.erode(flat, kernel)
+    return np.greater(img[:, 1:-1, 1:-1], 0, out=out)
+
+
+def _morph_frames(binimg, ops, out):
+    # the same operations frame by frame on a non-periodic lattice, whose default cv2 border neither
+    # grows nor erodes pixels; faster than stacking once frames are large enough to amortise the calls
+    kernel = np.ones((3, 3), dtype=np.uint8)
+    for frame, morphed in zip(binimg.view(np.uint8), out.view(np.uint8)):
+        for op in ops:
+            frame = cv2.dilate(frame, kernel) if op == 'd' else cv2.erode(frame, kernel)
+        morphed[...] = frame
+    return out
+
+
+def _morph(binimg, ops, periodic, threads=None):
+    # _morph_stack or _morph_frames on chunks of frames across threads, cv2 releases the GIL
+    out = np.empty(binimg.shape, dtype=bool)
+    if periodic or binimg[0].size < _frame_pixels:
+        def morph(start, stop):
+            _morph_stack(binimg[start:stop], ops, periodic, out[start:stop])
+    else:
+        def morph(start, stop):
+            _morph_frames(binimg[start:stop], ops, out[start:stop])
+    _chunked(morph, len(binimg), _chunk_bytes // binimg[0].size, threads)
+    return out
 
-    laplace = np.zeros(np.shape(phimat_curv))
-    for ax in [1, 2]:
-        push_b = np.roll(phimat_curv, -1, axis=ax)  # up/left
-        push_f = np.roll(phimat_curv, 1, axis=ax)  # down/right
-        pushes = [push_b, push_f]
 
-        dl = np.zeros(np.shape(phimat_curv))
-        for push in pushes:
-            pp = push - phimat_curv
-            dphi = np.array([pp - 2 * np.pi, pp, pp + 2 * np.pi])
-            dmin = np.amin(np.abs(dphi), axis=0)
+def _cores(binimg, periodic, threads=None):
+    # 8-connected components of every frame, labelled by cv2 on frames stacked with a zero border, one chunk
+    # of frames per thread. On a periodic lattice components touching across the edges are merged, and those cut
+    # by an edge are averaged in coordinates shifted by half the lattice. Returns the (T x rows x cols) labels,
+    # 0 for the background, the core of every label and per core its frame, size and centroid (x, y);
+    # the last T entries describe the background of every frame
+    T, rows, cols = binimg.shape
+    img = np.zeros((T, rows + 2, cols + 2), dtype=np.uint8)
+    img[:, 1:-1, 1:-1] = binimg
+    labels = np.empty(img.shape, dtype=np.int32)
 
-            c1 = np.around(np.abs(dphi), decimals=4)
-            c2 = np.around(dmin, decimals=4)
-            dphi[c1 != c2] = 0
-            dl += np.sum(dphi, axis=0)
-        laplace += np.abs(dl)
+    def label(start, stop):
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(
+            img[start:stop].reshape(-1, cols + 2), labels[start:stop].reshape(-1, cols + 2), connectivity=8,
+            ltype=cv2.CV_32S)
+        size = stats[1:, cv2.CC_STAT_AREA]
+        frame = stats[1:, cv2.CC_STAT_TOP] // (rows + 2)
+        # exact integer coordinate sums, recovered from the centroids and freed of the border offsets
+        sums = np.column_stack([np.rint(centroids[1:, 0] * size) - size,
+                                np.rint(centroids[1:, 1] * size) - size * (frame * (rows + 2) + 1)])
+        return start, stop, count - 1, size, frame + start, sums
 
-    return laplace / (4 * np.pi)
+    # chunks of an even number of frames start on even rows, where cv2 starts its 2 x 2 block scan, so they
+    # are numbered as by a single call
+    threads = threads or os.cpu_count()
+    parts = _chunked(label, T, 2 * -(-T // (2 * threads)), threads)
+    # labels of later chunks continue those of the earlier ones, the background stays 0
+    offset = 0
+    for start, stop, n, _, _, _ in parts:
+        if offset:
+            np.add(labels[start:stop], offset, out=labels[start:stop], where=labels[start:stop] > 0)
+        offset += n
+    count = offset + 1
+    labels = labels[:, 1:-1, 1:-1]
+    size = np.concatenate([[0]] + [p[3] for p in parts])
+    frame = np.concatenate([[0]] + [p[4] for p in parts])
+    sums = np.concatenate([np.zeros((1, 2))] + [p[5] for p in parts])
 
+    pairs = []
+    group = np.arange(count)
+    if periodic:
+        for axis, (left, right) in enumerate([(labels[:, :, -1], labels[:, :, 0]),
+                                              (labels[:, -1, :], labels[:, 0, :])]):
+            for d in [-1, 0, 1]:
+                a, b = left.ravel(), np.roll(right, d, axis=1).ravel()
+                keep = (a > 0) & (b > 0)
+                pairs.append((axis, a[keep], b[keep]))
+        a = np.concatenate([p[1] for p in pairs])
+        b = np.concatenate([p[2] for p in pairs])
+        count, group = connected_components(coo_matrix((np.ones(len(a)), (a, b)), shape=(count, count)),
+                                            directed=False)
+        group = group - group[0]  # the background keeps label 0
+        group[group < 0] += count
+    frame = np.concatenate([np.bincount(group, weights=frame, minlength=count) /
+                            np.maximum(np.bincount(group, minlength=count), 1), np.arange(T)]).astype(int)
 
-def gradient(phimat):
+    merged = np.bincount(group, weights=size, minlength=count)
+    background = rows * cols - np.bincount(frame[:count], weights=merged, minlength=T)
+    size = np.concatenate([merged, background]).astype(int)
+    centroid = np.zeros((count + T, 2))
+    for axis, n in enumerate([cols, rows]):
+        total = np.bincount(group, weights=sums[:, axis], minlength=count)
+        remainder = rows * cols * (n - 1) / 2 - np.bincount(frame[:count], weights=total, minlength=T)
+        centroid[:, axis] = np.concatenate([total, remainder]) / np.maximum(size, 1)
+        cut = np.zeros(count, dtype=bool)
+        for p in pairs:
+            cut[group[p[1]]] |= p[0] == axis
+        if np.any(cut):
+            # sum of (c + n // 2) % n, from the pixels at c >= n - n // 2 that wrap around
+            tail = labels[:, :, n - n // 2:] if axis == 0 else labels[:, n - n // 2:, :]
+            wrapped = np.bincount(group, weights=np.bincount(tail.ravel(), minlength=len(group)), minlength=count)
+            shifted = (total + n // 2 * merged - n * wrapped) / np.maximum(merged, 1)
+            centroid[:count][cut, axis] = (shifted[cut] - n // 2) % n
+    return labels, group, frame, size, centroid
+
+
+def gradient(phimat, periodic=True):
+    """
+    Phase gradient field of every frame, set to zero on and around spiral cores.
+    :param phimat: (T x rows x cols) phases
+    :param periodic: wrap the core morphology around the edges of a periodic lattice
+    :return: (T x rows x cols) x and y gradients
+    """
     pc = np.copy(phimat)
 
     # Control exclusion
@@ -82,42 +242,140 @@ def gradient(phimat):
     vx /= 2  # divide by length 2h
     vy /= 2  # divide by length 2h
 
-    # Core exclusion
+    # Core exclusion, closed over all frames at once
     laplace = curvature(pc)  # control_exclusion already accounted for
-    binimg = (laplace > 0.05)
-    binimg.dtype = np.uint8
-    kernel = np.ones((3, 3))
-    for i in range(len(binimg)):
-        morphed = cv2.morphologyEx(binimg[i], cv2.MORPH_CLOSE, kernel)
-        morphed.dtype = np.bool
-        vx[i][morphed] = 0
-        vy[i][morphed] = 0
+    morphed = _morph(laplace > 0.05, 'de', periodic)
+    vx[morphed] = 0
+    vy[morphed] = 0
 
     return vx, vy
 
 
-def spiral_centroid(laplace, init_pos=(0, 0)):
+def spiral_centroid(laplace, init_pos=(0, 0), periodic=True):
+    """
+    Follow the spiral core nearest to init_pos through the frames.
+    :param laplace: (T x rows x cols) curvature
+    :param init_pos: (x, y) near the core in the first frame
+    :param periodic: wrap the cores around the edges of a periodic lattice
+    :return: (T) core radius and (T x 2) core centroid (x, y)
+    """
     # The centroid must not be cut
     binimg = (laplace > 0.05)
-    binimg.dtype = np.uint8
+    rows, cols = binimg.shape[1:]
     yd, xd = np.where(binimg[0])
-    core_dist = (init_pos[0] - xd) ** 2 + (init_pos[1] - yd) ** 2
+    dx, dy = np.abs(init_pos[0] - xd), np.abs(init_pos[1] - yd)
+    if periodic:
+        dx, dy = np.minimum(dx, cols - dx), np.minimum(dy, rows - dy)
+    core_dist = dx ** 2 + dy ** 2
     mask = (min(core_dist) == core_dist)
     pos = [xd[mask][0], yd[mask][0]]
 
+    # reduce the dilated and closed cores of all frames to their sizes and centroids at once
+    cores, group, _, size, centres = _cores(_morph(binimg, 'dde', periodic), periodic)
+    count = len(size) - len(binimg)
+    size, centres = size.tolist(), centres.tolist()
+
     radius = np.zeros(len(binimg))
     centroid = np.zeros((len(binimg), 2))
-    kernel = np.ones((3, 3))
     for i in range(len(binimg)):
-        morphed = cv2.dilate(binimg[i], kernel, iterations=1)
-        morphed = cv2.morphologyEx(morphed, cv2.MORPH_CLOSE, kernel)
-        cores, num_spots = nd.label(morphed, structure=kernel)
-        value = cores[pos[1], pos[0]]
-        yc, xc = np.where(cores == value)
-        xcm, ycm = np.mean(xc), np.mean(yc)
-
-        radius[i] = np.sqrt(len(xc) / np.pi)
+        value = group[cores[i, pos[1], pos[0]]]
+        if value == 0:
+            value = count + i  # off every core, the background of this frame is followed instead
+        xcm, ycm = centres[value]
+
+        radius[i] = np.sqrt(size[value] / np.pi)
         centroid[i] = [xcm, ycm]
         pos = [int(xcm), int(ycm)]
 
     return radius, centroid
+
+
+def _follow(binimg, x, y, window, periodic):
+    # size and centroid of the dilated and closed core at or nearest to (x, y) in a frame, processing
+    # only a window around it. The window is widened while the core reaches its edge; None once no core
+    # is left in the window, False once the window would cover the whole frame
+    rows, cols = binimg.shape
+    while 2 * window + 1 < min(rows, cols):
+        # the morphology reaches 3 sites, so the window is processed with a margin of 3
+        ys = np.arange(int(y) - window - 3, int(y) + window + 4)
+        xs = np.arange(int(x) - window - 3, int(x) + window + 4)
+        if not periodic:
+            ys, xs = ys[(ys >= 0) & (ys < rows)], xs[(xs >= 0) & (xs < cols)]
+        img = _morph_stack(binimg[np.ix_(ys % rows, xs % cols)][np.newaxis], 'dde', False)[0]
+        inner_y, inner_x = np.abs(ys - int(y)) <= window, np.abs(xs - int(x)) <= window
+        img, ys, xs = img[np.ix_(inner_y, inner_x)], ys[inner_y], xs[inner_x]
+
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(img.view(np.uint8), connectivity=8)
+        if count == 1:
+            return None
+        core = labels[int(y) - ys[0], int(x) - xs[0]]
+        if core == 0:
+            core = 1 + np.argmin(np.hypot(centroids[1:, 0] - (int(x) - xs[0]), centroids[1:, 1] - (int(y) - ys[0])))
+        left, top, width, height, size = stats[core]
+        # only edges of the window, not those of a non-periodic lattice, can cut the core
+        edges = [top == 0 and ys[0] > 0, left == 0 and xs[0] > 0,
+                 top + height == len(ys) and ys[-1] < rows - 1, left + width == len(xs) and xs[-1] < cols - 1]
+        if periodic:
+            edges = [top == 0, left == 0, top + height == len(ys), left + width == len(xs)]
+        if not any(edges):
+            cx, cy = xs[0] + centroids[core, 0], ys[0] + centroids[core, 1]
+            return size, cx % cols if periodic else cx, cy % rows if periodic else cy
+        window *= 2
+    return False
+
+
+def track_cores(laplace, window=8, periodic=True, threads=None):
+    """
+    Detect every spiral core in the first frame and follow each one through the frames,
+    processing only a window around its previous centroid. Cores are tracked in parallel threads;
+    cores too large for any window are followed on whole frames, labelled together.
+    :param laplace: (T x rows x cols) curvature
+    :param window: (int) half-width of the search window, widened while a core reaches its edge
+    :param periodic: wrap the cores and windows around the edges of a periodic lattice
+    :param threads: (int) worker threads the cores are spread across, os.cpu_count() by default
+    :return: (T x C) core radii and (T x C x 2) core centroids (x, y), NaN once a core is lost
+    """
+    binimg = laplace > 0.05
+    T, rows, cols = binimg.shape
+    _, _, _, size, centres = _cores(_morph(binimg[:1], 'dde', periodic), periodic)
+    radius = np.full((T, len(size) - 2), np.nan)
+    centroid = np.full((T, len(size) - 2, 2), np.nan)
+    radius[0], centroid[0] = np.sqrt(size[1:-1] / np.pi), centres[1:-1]
+
+    def follow(c):
+        # frame from which the core has to be followed on whole frames, T if it never has to
+        x, y = centroid[0, c]
+        for i in range(1, T):
+            found = _follow(binimg[i], x, y, window, periodic)
+            if found is None:
+                return T
+            if found is False:
+                return i
+            n, x, y = found
+            radius[i, c], centroid[i, c] = np.sqrt(n / np.pi), [x, y]
+        return T
+
+    with ThreadPoolExecutor(threads or os.cpu_count()) as pool:
+        start = list(pool.map(follow, range(len(size) - 2)))
+
+    if min(start, default=T) < T:
+        first = min(start)
+        cores, group, frame, size, centres = _cores(_morph(binimg[first:], 'dde', periodic, threads), periodic, threads)
+        size, frame = size[:-len(cores)], frame[:-len(cores)]
+        for c in np.flatnonzero(np.array(start) < T):
+            x, y = centroid[start[c] - 1, c]
+            for i in range(start[c], T):
+                core = group[cores[i - first, int(y) % rows, int(x) % cols]]
+                if core == 0:
+                    # off every core, the nearest core of the frame is followed instead
+                    candidates = np.flatnonzero(frame == i - first)
+                    candidates = candidates[candidates > 0]
+                    if len(candidates) == 0:
+                        break
+                    dx, dy = np.abs(centres[candidates, 0] - x), np.abs(centres[candidates, 1] - y)
+                    if periodic:
+                        dx, dy = np.minimum(dx, cols - dx), np.minimum(dy, rows - dy)
+                    core = candidates[np.argmin(np.hypot(dx, dy))]
+                x, y = centres[core]
+                radius[i, c], centroid[i, c] = np.sqrt(size[core] / np.pi), [x, y]
+    return radius, centroid
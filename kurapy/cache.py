@@ -0,0 +1,99 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import numpy as np
+
+
+class Cache:
+    def __init__(self, directory=None, memory=8, limit=2 ** 32):
+        """
+        Content-keyed store of lattice distances and dense couplings, passed as cache= to
+        Lattice.set_distances and the coupling builders. Arrays are kept in an in-process LRU and as .npy
+        files loaded with mmap_mode='r', so processes sharing the directory share one page-cached copy.
+        Cached arrays are read-only.
+        :param directory: on-disk layer, $KURAPY_CACHE or ~/.cache/kurapy by default
+        :param memory: (int) arrays kept in the in-process LRU
+        :param limit: (int) bytes on disk, least recently used files are evicted beyond it
+        """
+        if directory is None:
+            directory = os.environ.get('KURAPY_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'kurapy'))
+        self.directory = directory
+        self.memory = memory
+        self.limit = limit
+        self._lru = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, **fields):
+        """
+        :param fields: everything the array depends on, e.g. size, metric, periodic, dtype, coupling and n
+        :return: (str) file name stem of the array
+        """
+        digest = hashlib.sha1(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+        return '{}-{}'.format(fields.get('coupling', 'distances'), digest[:20])
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key, build):
+        """
+        :param key: (str) from key
+        :param build: function of no arguments computing the array on a miss
+        :return: cached array, memmapped when stored on disk
+        """
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return self._lru[key]
+        path = self._path(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+            os.utime(path)  # recently used, so evicted last
+        except (FileNotFoundError, ValueError):
+            array = build()
+            if array.nbytes <= self.limit:
+                self._store(path, array)
+                array = np.load(path, mmap_mode='r')
+        self._lru[key] = array
+        if len(self._lru) > self.memory:
+            self._lru.popitem(last=False)
+        return array
+
+    def _store(self, path, array):
+        # written under a temporary name and renamed, so concurrent readers never see a partial file
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used files until the directory holds at most limit bytes.
+        Processes still mapping a removed file keep reading it.
+        :param keep: path never removed
+        """
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.npy'):
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                pass  # evicted by another process meanwhile
+        total = sum(f[1] for f in files)
+        for _, size, path in sorted(files):
+            if total <= self.limit:
+                break
+            if path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        self._lru.clear()
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                os.remove(os.path.join(self.directory, name))
@@ -1,47 +1,228 @@
 import numpy as np
+import scipy.sparse as sp
 
+forms = ['dense', 'kernel', 'lowrank', 'sparse']
+_block_size = 2 ** 18  # distances per block when building from a lazy lattice
 
-def constant(lattice):
-    K = np.ones((lattice.N, lattice.N))
+
+class Kernel:
+    def __init__(self, kernel):
+        """
+        Translation-invariant coupling on a periodic lattice, K[a, b] = kernel[pos_a - pos_b],
+        applied as a circular convolution with numpy.fft instead of an (N x N) matrix.
+        :param kernel: (L x L) coupling indexed by (dy, dx) displacement, float32 kernels stay single precision
+        """
+        self.kernel = np.asarray(kernel, dtype=_float(kernel))
+        self.dtype = self.kernel.dtype
+        self.shape = self.kernel.shape
+        self.N = self.kernel.size
+        self._fkernel = np.fft.rfft2(self.kernel)
+
+    @property
+    def T(self):
+        return Kernel(np.roll(self.kernel[::-1, ::-1], 1, axis=(0, 1)))
+
+    def __matmul__(self, x):
+        x = np.asarray(x)
+        xs = x.reshape(self.shape + x.shape[1:])
+        fk = self._fkernel.reshape(self._fkernel.shape + (1,) * (x.ndim - 1))
+        out = np.fft.irfft2(np.fft.rfft2(xs, axes=(0, 1)) * fk, s=self.shape, axes=(0, 1))
+        return out.reshape(x.shape)
+
+    def toarray(self):
+        y, x = np.divmod(np.arange(self.N), self.shape[1])
+        return self.kernel[np.subtract.outer(y, y) % self.shape[0], np.subtract.outer(x, x) % self.shape[1]]
+
+
+class LowRank:
+    def __init__(self, U, V, diagonal=0):
+        """
+        Factored coupling K = U V^T + diag(diagonal), applied in O(N r) without forming K.
+        :param U: (N x r) left factor
+        :param V: (N x r) right factor
+        :param diagonal: (N) or scalar diagonal correction
+        """
+        self.U = np.asarray(U, dtype=_float(U))
+        self.V = np.asarray(V, dtype=_float(V))
+        self.dtype = np.result_type(self.U, self.V)
+        self.diagonal = diagonal
+        self.shape = (len(self.U), len(self.V))
+        self.N = len(self.U)
+        self.rank = self.U.shape[1]
+
+    @property
+    def T(self):
+        return LowRank(self.V, self.U, self.diagonal)
+
+    def __matmul__(self, x):
+        x = np.asarray(x)
+        d = np.reshape(self.diagonal, np.shape(self.diagonal) + (1,) * (x.ndim - np.ndim(self.diagonal)))
+        return self.U @ (self.V.T @ x) + d * x
+
+    def toarray(self):
+        K = self.U @ self.V.T
+        K[np.diag_indices(self.N)] += np.asarray(self.diagonal, dtype=K.dtype)
+        return K
+
+
+def _float(a):
+    # keep floating point inputs in their precision, promote anything else to float64
+    dtype = np.asarray(a).dtype
+    return dtype if np.issubdtype(dtype, np.floating) else np.float64
+
+
+def _cos_factors(lattice, n):
+    # cos(2 pi n (p_a - p_b)) = cos(2 pi n p_a) cos(2 pi n p_b) + sin(2 pi n p_a) sin(2 pi n p_b)
+    # per axis; with periodic minimum images this needs an integer n
+    if lattice.periodic and n != int(n):
+        raise ValueError('Low-rank form on a periodic lattice requires an integer n.')
+    theta = 2 * np.pi * n * lattice.positions / lattice.size
+    return np.hstack([np.cos(theta), np.sin(theta)]).astype(lattice.dtype)
+
+
+def _check(form, available):
+    if form not in forms:
+        raise ValueError('Invalid form. Expected one of: {}'.format(forms))
+    if form not in available:
+        raise ValueError('Form {} is not available for this coupling.'.format(form))
+
+
+def _cached(cache, lattice, form, build, **fields):
+    # dense matrices are looked up by everything they depend on; the distance mode does not change them
+    if cache is None or form != 'dense':
+        return build()
+    key = cache.key(size=lattice.size, metric=lattice.metric, periodic=lattice.periodic,
+                    dtype=np.dtype(lattice.dtype).name, **fields)
+    return cache.get(key, build)
+
+
+def _build(profile, lattice, form):
+    # profile maps distances to coupling strengths; works for every Lattice mode
+    _check(form, ['dense', 'kernel'])
+    if form == 'kernel':
+        if not lattice.periodic:
+            raise ValueError('Kernel coupling requires a periodic lattice.')
+        K = profile(lattice.row(0)).reshape((lattice.size, lattice.size))
+        K[0, 0] = 0
+        return Kernel(K)
+    if lattice.distances is not None:
+        K = profile(lattice.distances)
+    else:
+        K = np.empty((lattice.N, lattice.N), dtype=lattice.dtype)
+        step = max(1, _block_size // lattice.N)
+        for i in range(0, lattice.N, step):
+            K[i:i + step] = profile(lattice.block(slice(i, i + step)))
     np.fill_diagonal(K, 0)
     return K
 
 
-def neighbour(lattice):
+def edges(edge_list, N, weights=None, directed=False, dtype=np.float64):
+    """
+    Sparse coupling of an arbitrary graph, K[source, target] = weight.
+    :param edge_list: (E x 2) pairs of (source, target) site indices
+    :param N: number of oscillators
+    :param weights: (E) edge weights, 1 by default
+    :param directed: if False, every edge also couples target to source
+    :param dtype: floating point type of the matrix
+    :return: (N x N) scipy.sparse CSR coupling matrix
+    """
+    e = np.asarray(edge_list, dtype=int).reshape(-1, 2)
+    w = np.ones(len(e), dtype=dtype) if weights is None else np.asarray(weights, dtype=dtype)
+    if not directed:
+        e = np.vstack([e, e[:, ::-1]])
+        w = np.concatenate([w, w])
+    keep = e[:, 0] != e[:, 1]
+    K = sp.csr_matrix((w[keep], (e[keep, 0], e[keep, 1])), shape=(N, N))
+    K.sum_duplicates()
+    return K
+
+
+def grid(shape, periodic=True, dtype=np.float64):
+    """
+    Sparse nearest-neighbour coupling on a rectangular grid, site index = row * cols + col.
+    :param shape: (rows, cols) of the grid
+    :param periodic: wrap the grid into a torus
+    :param dtype: floating point type of the matrix
+    :return: (N x N) scipy.sparse CSR coupling matrix
+    """
+    rows, cols = shape
+    y, x = np.divmod(np.arange(rows * cols), cols)
+    pairs = []
+    for dy, dx in [(1, 0), (0, 1)]:
+        yn, xn = y + dy, x + dx
+        if periodic:
+            keep = np.ones(len(y), dtype=bool)
+        else:
+            keep = (yn < rows) & (xn < cols)
+        pairs.append(np.column_stack([y * cols + x, (yn % rows) * cols + xn % cols])[keep])
+    K = edges(np.vstack(pairs), rows * cols, dtype=dtype)
+    K.data[:] = 1  # neighbours on either side coincide on a 2-wide periodic axis
+    return K
+
+
+def constant(lattice, form='dense', cache=None):
+    _check(form, ['dense', 'kernel', 'lowrank'])
+    if form == 'lowrank':
+        return LowRank(np.ones((lattice.N, 1), dtype=lattice.dtype), np.ones((lattice.N, 1), dtype=lattice.dtype), -1)
+    if form == 'kernel':
+        K = np.ones((lattice.size, lattice.size), dtype=lattice.dtype)
+        K[0, 0] = 0
+        return Kernel(K)
+
+    def build():
+        K = np.ones((lattice.N, lattice.N), dtype=lattice.dtype)
+        np.fill_diagonal(K, 0)
+        return K
+
+    return _cached(cache, lattice, form, build, coupling='constant')
+
+
+def neighbour(lattice, form='dense', cache=None):
     # only couples to immediate neighbours
     metrics = ['cartesian', 'euclidean']
     thres = 1.01 / lattice.size
-    K = np.zeros((lattice.N, lattice.N))
-    if lattice.metric == 'cartesian':
-        distances = np.sum(lattice.distances, axis=-1)
-    elif lattice.metric == 'euclidean':
-        distances = lattice.distances
-    else:
+    if lattice.metric not in metrics:
         raise TypeError('Lattice metric mismatch. Expected one of: {}'.format(metrics))
-    K[distances < thres] = 1
-    np.fill_diagonal(K, 0)
-    return K
+    if form == 'sparse':
+        return grid((lattice.size, lattice.size), lattice.periodic, dtype=lattice.dtype)
+
+    def profile(d):
+        if lattice.metric == 'cartesian':
+            d = np.sum(d, axis=-1)
+        return (d < thres).astype(d.dtype)
+
+    return _cached(cache, lattice, form, lambda: _build(profile, lattice, form), coupling='neighbour')
 
 
-def cosine(lattice, n=1):
+def cosine(lattice, n=1, form='dense', cache=None):
     metric = 'cartesian'
     if lattice.metric == metric:
-        gx = np.cos(2 * np.pi * n * lattice.distances[:, :, 0])
-        gy = np.cos(2 * np.pi * n * lattice.distances[:, :, 1])
-        K = gx + gy
-        np.fill_diagonal(K, 0)
-        return K
+        if form == 'lowrank':
+            F = _cos_factors(lattice, n)
+            return LowRank(F, F, -2)
+
+        def profile(d):
+            gx = np.cos(2 * np.pi * n * d[..., 0])
+            gy = np.cos(2 * np.pi * n * d[..., 1])
+            return gx + gy
+
+        return _cached(cache, lattice, form, lambda: _build(profile, lattice, form), coupling='cosine', n=n)
     else:
         raise TypeError('Lattice metric mismatch. Expected: {}'.format(metric))
 
 
-def cosine2(lattice, n=1):
+def cosine2(lattice, n=1, form='dense', cache=None):
     metric = 'cartesian'
     if lattice.metric == metric:
-        gx = 0.5 * (np.cos(2 * np.pi * n * lattice.distances[:, :, 0]) + np.cos(2 * np.pi * (n + 1) * lattice.distances[:, :, 0]))
-        gy = 0.5 * (np.cos(2 * np.pi * n * lattice.distances[:, :, 1]) + np.cos(2 * np.pi * (n + 1) * lattice.distances[:, :, 1]))
-        K = gx + gy
-        np.fill_diagonal(K, 0)
-        return K
+        if form == 'lowrank':
+            F = np.hstack([_cos_factors(lattice, n), _cos_factors(lattice, n + 1)])
+            return LowRank(F, 0.5 * F, -2)
+
+        def profile(d):
+            gx = 0.5 * (np.cos(2 * np.pi * n * d[..., 0]) + np.cos(2 * np.pi * (n + 1) * d[..., 0]))
+            gy = 0.5 * (np.cos(2 * np.pi * n * d[..., 1]) + np.cos(2 * np.pi * (n + 1) * d[..., 1]))
+            return gx + gy
+
+        return _cached(cache, lattice, form, lambda: _build(profile, lattice, form), coupling='cosine2', n=n)
     else:
         raise TypeError('Lattice metric mismatch. Expected: {}'.format(metric))
@@ -0,0 +1,49 @@
+import numpy as np
+from .model import Model
+from .observers import order
+
+
+def _column(x):
+    # per-member parameters broadcast against the (B x N) state block
+    return np.reshape(x, (-1, 1)) if np.ndim(x) else x
+
+
+class Ensemble(Model):
+    def __init__(self, freq, coupling, shift=0, scale=1, noise=0, control=None, second_order=0, damping=1,
+                 dtype=None):
+        """
+        B realisations sharing one coupling, integrated together as a (B x N) state block
+        so the coupling evaluation becomes a matrix-matrix product.
+        :param freq: (N) or (B x N) natural oscillator frequencies
+        :param coupling: (N x N) dense or scipy.sparse coupling matrix, coupling.Kernel or coupling.LowRank
+        :param shift: scalar or (B) phase shifts
+        :param scale: scalar or (B) coupling strength factors
+        :param noise: scalar or (B) Gaussian noise levels
+        :param control: (rows x cols) control strength ranging from 0 to 1 on a grid of N sites
+        :param second_order: scalar or (B) inertia of the second-order model
+        :param damping: scalar or (B) damping of the second-order model
+        :param dtype: float32 or float64 state, the precision of the coupling by default
+        """
+        super().__init__(np.asarray(freq), coupling, shift=_column(shift), noise=_column(noise), control=control,
+                         second_order=_column(second_order), damping=_column(damping), dtype=dtype)
+        self._scale = _column(scale)
+
+    def interaction(self, phi, out=None, work=None):
+        out = super().interaction(phi, out=out, work=work)
+        out *= self._scale
+        return out
+
+    def observe(self, t, phi0, fn=None, method='rk4', stride=1, rng=None):
+        """
+        Reduce every recorded frame on the fly instead of storing trajectories.
+        :param t: (T) integration time grid
+        :param phi0: (B x N) initial phases
+        :param fn: maps (B x N) phases to per-member values, global order parameter R by default
+        :param method: integration method
+        :param stride: reduce every stride-th step
+        :param rng: numpy.random.Generator or seed for the noise
+        :return: (T / stride x B ...) reduced values
+        """
+        if fn is None:
+            fn = order
+        return np.array([fn(phi) for _, phi in self.iterate(t, phi0, method=method, stride=stride, rng=rng)])
@@ -4,6 +4,8 @@ import numpy as np
 class Lattice:
     def __init__(self, size):
         self._metrics = ['cartesian', 'euclidean']
+        self._modes = ['dense', 'lazy', 'table']
+        self._block_size = 2 ** 18  # distances per block when filling the dense table
 
         self.size = size
         self.N = int(size ** 2)
@@ -11,36 +13,83 @@ class Lattice:
         self.positions = np.vstack(np.meshgrid(x, x)).reshape(2, -1).T
 
         self.metric = None
+        self.periodic = None
+        self.mode = None
+        self.dtype = None
         self.distances = None
+        self.table = None
 
-    def set_distances(self, metric, periodic=True):
+    def set_distances(self, metric, periodic=True, mode='dense', dtype=np.float64, cache=None):
+        """
+        :param metric: 'cartesian' for per-axis distances, 'euclidean' for norms
+        :param periodic: use minimum-image distances on the torus
+        :param mode: 'dense' stores the (N x N) distances, 'lazy' computes rows on access,
+                     'table' stores only the (L x L) distances per absolute displacement
+        :param dtype: floating point type of the distances
+        :param cache: cache.Cache sharing the read-only dense table between runs and processes
+        """
         metric = metric.lower()
+        if mode not in self._modes:
+            raise ValueError('Invalid mode. Expected one of: {}'.format(self._modes))
         if metric in self._metrics:
-            pos = self.positions / self.size
-            rep_pos = np.repeat(np.expand_dims(pos, axis=0), self.N, axis=0)
-
-            if metric == 'euclidean':
-                rep_pos_norm = rep_pos - np.transpose(rep_pos, (1, 0, 2))
-                dmin = np.linalg.norm(rep_pos_norm, axis=2)
-                if periodic:
-                    for i in range(-1, 2):
-                        for j in range(-1, 2):
-                            if i != 0 or j != 0:
-                                dist = np.linalg.norm(rep_pos_norm + np.array([i, j]), axis=2)
-                                dmin = np.minimum(dmin, dist)
-                self.metric = metric
-                self.distances = dmin
-
-            elif metric == 'cartesian':
-                dmin = abs(rep_pos - np.transpose(rep_pos, (1, 0, 2)))
-                if periodic:
-                    for i in range(-1, 2):
-                        for j in range(-1, 2):
-                            if i != 0 or j != 0:
-                                dist = abs(dmin + np.array([i, j]))
-                                dmin = np.minimum(dmin, dist)
-                self.metric = metric
-                self.distances = dmin
+            self.metric = metric
+            self.periodic = periodic
+            self.mode = mode
+            self.dtype = np.dtype(dtype)
+            self.distances = None
+            self.table = None
+
+            if mode == 'table':
+                d = np.arange(self.size)
+                self.table = self._measure(d[np.newaxis, :], d[:, np.newaxis])
+            elif mode == 'dense' and cache is not None:
+                key = cache.key(size=self.size, metric=metric, periodic=periodic, dtype=self.dtype.name)
+                self.distances = cache.get(key, self._dense)
+            elif mode == 'dense':
+                self.distances = self._dense()
 
         else:
             raise ValueError('Invalid metric. Expected one of: {}'.format(self._metrics))
+
+    def _dense(self):
+        shape = (self.N, self.N, 2) if self.metric == 'cartesian' else (self.N, self.N)
+        distances = np.empty(shape, dtype=self.dtype)
+        step = max(1, self._block_size // self.N)
+        for i in range(0, self.N, step):
+            distances[i:i + step] = self.block(slice(i, i + step))
+        return distances
+
+    def _measure(self, dx, dy):
+        # distances from integer displacements, without replicating positions
+        dx, dy = np.broadcast_arrays(np.abs(dx), np.abs(dy))
+        if self.periodic:
+            dx = np.minimum(dx, self.size - dx)
+            dy = np.minimum(dy, self.size - dy)
+        if self.metric == 'euclidean':
+            return (np.hypot(dx, dy) / self.size).astype(self.dtype)
+        return (np.stack([dx, dy], axis=-1) / self.size).astype(self.dtype)
+
+    def block(self, sites):
+        """
+        Distances from a block of sites to every site, computed on demand unless stored.
+        :param sites: (int, slice or B) site indices
+        :return: (B x N x 2) cartesian or (B x N) euclidean distances
+        """
+        if self.metric is None:
+            raise ValueError('Distances not set. Call set_distances first.')
+        if self.distances is not None:
+            return self.distances[sites]
+        p = self.positions[sites]
+        dx = np.subtract.outer(p[..., 0], self.positions[:, 0])
+        dy = np.subtract.outer(p[..., 1], self.positions[:, 1])
+        if self.table is not None:
+            return self.table[np.abs(dy), np.abs(dx)]
+        return self._measure(dx, dy)
+
+    def row(self, i):
+        """
+        Distances from site i to every site.
+        :param i: (int) site index
+        :return: (N x 2) cartesian or (N) euclidean distances
+        """
+        return self.block(i)
@@ -1,84 +1,479 @@
-import sys
+from contextlib import nullcontext
 import numpy as np
+from . import sinks
+from .monitor import Monitor
+from . import stepper as steppers
+from .stepper import Stepper
+
+# Dormand-Prince 5(4) tableau with the 4th-order continuous extension used for dense output
+_DP_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1])
+_DP_A = [np.array([]),
+         np.array([1 / 5]),
+         np.array([3 / 40, 9 / 40]),
+         np.array([44 / 45, -56 / 15, 32 / 9]),
+         np.array([19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729]),
+         np.array([9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656])]
+_DP_B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84])
+_DP_E = np.array([-71 / 57600, 0, 71 / 16695, -71 / 1920, 17253 / 339200, -22 / 525, 1 / 40])
+_DP_P = np.array([
+    [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+    [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+    [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+    [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+    [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423]])
 
 
 class Model:
-    def __init__(self, freq, coupling, shift=0, second_order=0, noise=0, control=None):
+    def __init__(self, freq, coupling, shift=0, second_order=0, noise=0, control=None, damping=1, dtype=None):
         """
         :param freq: (N) natural oscillator frequencies
-        :param coupling: (N x N) coupling matrix
+        :param coupling: (N x N) dense or scipy.sparse coupling matrix, coupling.Kernel or coupling.LowRank
         :param shift: (int) phase shift
-        :param second_order: (int) second-order contribution
+        :param second_order: (float) inertia m of the second-order model
+                             m phi'' + damping phi' = freq + coupling, 0 for the first-order model
         :param noise: (int) Gaussian noise level
-        :param control: (N x N) control strength ranging from 0 to 1
+        :param control: (rows x cols) control strength ranging from 0 to 1 on a grid of N sites,
+                        or a function of time returning one
+        :param damping: (float) damping of the second-order model
+        :param dtype: float32 or float64 state and work buffers, the precision of the coupling by default
         """
-        self._N = len(freq)
-        self._L = int(np.sqrt(self._N))
-        self._freq = freq
+        if dtype is None:
+            dtype = getattr(coupling, 'dtype', np.float64)
+            dtype = dtype if np.issubdtype(dtype, np.floating) else np.float64
+        self._dtypes = [np.dtype(np.float32), np.dtype(np.float64)]
+        if np.dtype(dtype) not in self._dtypes:
+            raise ValueError('Invalid dtype. Expected one of: {}'.format([d.name for d in self._dtypes]))
+        self._dtype = np.dtype(dtype)
+        self._N = np.shape(freq)[-1]
+        self._pinned = {}
+        self._last_pinned = None
+        if control is not None and not callable(control):
+            self._pinning(control)
+        self._freq = np.asarray(freq, dtype=self._dtype)
         self._coupling = coupling
+        self._coupling_T = coupling.T
         self._second_order = second_order
+        self._damping = damping
         self._shift = shift
         self._noise = noise
         self._control = control
-        self._methods = ['forward_euler', 'rk4']
-
-    def evolve(self, t, phi0, method='rk4', verbose=False):
-        if method in self._methods:
-
-            def dpdt(phi):
-                return self._freq + np.sum(self._coupling * np.sin(np.subtract.outer(phi, phi) + self._shift), axis=0) / self._N + np.random.normal(0, self._noise * np.pi, size=self._N)
-
-            def apply_control(phi):
-                phimat = np.reshape(phi, (self._L, self._L))
-                sites = np.argwhere(self._control != 0)
-                new_phimat = phimat.copy()
-                for s in sites:
-                    locs = [(s[0], (s[1] - 1) % self._L),
-                            (s[0], (s[1] + 1) % self._L),
-                            ((s[0] - 1) % self._L, s[1]),
-                            ((s[0] + 1) % self._L, s[1])]
-                    ns = []
-                    for i in locs:
-                        if self._control[i[0], i[1]] == 0:
-                            ns.append(np.exp(1j * phimat[i[0], i[1]]))
-                    if not ns:
-                        ns.append(0)
-                    new_phimat[s[0], s[1]] = np.angle(np.mean(ns, axis=0)) + self._control[s[0], s[1]] * np.pi
-                return np.reshape(new_phimat % (2 * np.pi), self._N)
-
-            def verbosity(idx, length):
-                sys.stdout.flush()
-                sys.stdout.write('\rTime Step: {}/{}'.format(idx + 1, length))
-
-            dt = t[1] - t[0]
-            phis = np.zeros((len(t), len(phi0)))
-            phis[0] = phi0
-
-            if method == 'forward_euler':
-                for i in range(len(phis) - 1):
-                    if verbose:
-                        verbosity(i, len(t))
-                    k = dpdt(phis[i])
-                    phis[i + 1] = (phis[i] + dt * k) % (2 * np.pi)
-                    if self._control is not None:
-                        phis[i + 1] = apply_control(phis[i + 1])
-
-            elif method == 'rk4':
-                for i in range(len(phis) - 1):
-                    if verbose:
-                        verbosity(i, len(t))
-                    k1 = dpdt(phis[i])
-                    k2 = dpdt(phis[i] + 0.5 * dt * k1)
-                    k3 = dpdt(phis[i] + 0.5 * dt * k2)
-                    k4 = dpdt(phis[i] + dt * k3)
-                    phis[i + 1] = (phis[i] + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)) % (2 * np.pi)
-                    if self._control is not None:
-                        phis[i + 1] = apply_control(phis[i + 1])
+        self._methods = ['forward_euler', 'rk4', 'dopri5', 'verlet', 'euler_maruyama', 'heun']
+        self.stats = {'accepted': 0, 'rejected': 0, 'evaluations': 0}
 
-            else:
-                raise ValueError('Invalid method. Expected one of: {}'.format(self._methods))
+    # parameters the Stepper integrates with; Ensemble holds them as (B x 1) columns
+    @property
+    def dtype(self):
+        return self._dtype
+
+    @property
+    def freq(self):
+        return self._freq
+
+    @property
+    def noise(self):
+        return self._noise
+
+    @property
+    def second_order(self):
+        return self._second_order
+
+    @property
+    def damping(self):
+        return self._damping
+
+    @property
+    def controlled(self):
+        return self._control is not None
+
+    def _pinning(self, mask):
+        # controlled sites, their 4 grid neighbours and which of those are free, computed once per
+        # distinct mask; masks are treated as immutable, so time-dependent ones return a new array on change
+        if self._last_pinned is not None and self._last_pinned[0] is mask:
+            return self._last_pinned[1]
+        array = np.asarray(mask)
+        if array.size != self._N:
+            raise ValueError('Control shape {} does not match {} oscillators.'.format(array.shape, self._N))
+        key = (array.shape, array.tobytes())
+        if key not in self._pinned:
+            rows, cols = array.shape
+            r, c = np.nonzero(array)
+            neighbours = np.stack([r * cols + (c - 1) % cols,
+                                   r * cols + (c + 1) % cols,
+                                   ((r - 1) % rows) * cols + c,
+                                   ((r + 1) % rows) * cols + c], axis=-1)
+            free = array.reshape(-1)[neighbours] == 0
+            if len(self._pinned) >= 256:
+                self._pinned.clear()
+            self._pinned[key] = (r * cols + c, neighbours, free, array[r, c] * np.pi)
+        self._last_pinned = (mask, self._pinned[key])
+        return self._pinned[key]
+
+    def workspace(self, shape):
+        """
+        Work buffers of interaction, allocated once by callers evaluating it repeatedly such as the Stepper.
+        :param shape: (N) or (B x N) shape of the phases
+        :return: buffers passed to interaction as work
+        """
+        B = int(np.prod(shape[:-1], dtype=int))
+        sc = np.empty((2, B, self._N), dtype=self._dtype)
+        prod = np.empty((self._N, 2 * B), dtype=self._dtype)
+        return (sc[0], sc[1], sc.reshape(-1, self._N).T, prod,
+                prod[:, :B].T.reshape(shape), prod[:, B:].T.reshape(shape), np.empty(shape, dtype=self._dtype))
 
-            return phis
+    def interaction(self, phi, out=None, work=None):
+        """
+        Coupling term sum_j K_ji sin(phi_j - phi_i + shift) / N, expanded as
+        sin(phi_j + shift) cos(phi_i) - cos(phi_j + shift) sin(phi_i) so that
+        it reduces to a single (N x 2) matrix product. With out and work given,
+        evaluations allocate nothing for dense couplings.
+        :param phi: (N) or (B x N) oscillator phases
+        :param out: array receiving the result, allocated if None
+        :param work: buffers from workspace(phi.shape), allocated per call if None
+        :return: coupling contribution to dphi/dt, same shape as phi
+        """
+        shape = np.shape(phi)
+        if work is None:
+            work = self.workspace(shape)
+        s, c, x, prod, S, C, trig = work
+        if out is None:
+            out = np.empty(shape, dtype=self._dtype)
 
+        np.add(phi, self._shift, out=c)
+        np.sin(c, out=s)
+        np.cos(c, out=c)
+        if isinstance(self._coupling_T, np.ndarray):
+            np.matmul(self._coupling_T, x, out=prod)
         else:
+            prod[...] = self._coupling_T @ x
+
+        np.cos(phi, out=trig)
+        np.multiply(S, trig, out=out)
+        np.sin(phi, out=trig)
+        np.multiply(C, trig, out=trig)
+        np.subtract(out, trig, out=out)
+        out /= self._N
+        return out
+
+    def drift(self, phi, out=None, work=None):
+        """
+        Deterministic right-hand side freq + coupling of the first-order model, the force of the second-order one.
+        :param phi: (N) or (B x N) oscillator phases
+        :param out: array receiving the result, allocated if None
+        :param work: buffers from workspace(phi.shape), allocated per call if None
+        :return: same shape as phi
+        """
+        out = self.interaction(phi, out=out, work=work)
+        out += self._freq
+        return out
+
+    def control(self, phi, time):
+        """
+        Pin the controlled sites to the mean phase of their free neighbours, in place; requires controlled.
+        :param phi: (N) or (B x N) oscillator phases
+        :param time: time passed to a time-dependent control
+        :return: phi
+        """
+        mask = self._control(time) if callable(self._control) else self._control
+        sites, neighbours, free, pin = self._pinning(mask)
+        # the angle of the sum over free neighbours equals that of their mean, 0 if none are free
+        z = np.sum(np.exp(1j * phi[..., neighbours]) * free, axis=-1)
+        phi[..., sites] = (np.angle(z) + pin) % (2 * np.pi)
+        return phi
+
+    def iterate(self, t, phi0, method='rk4', stride=1, verbose=False, rtol=1e-3, atol=1e-6, omega0=None,
+                state=False, rng=None, monitor=None):
+        """
+        Integrate on the uniform step grid t, yielding frames as they are produced.
+        The adaptive 'dopri5' method chooses its own steps and interpolates onto t instead.
+        Step counts of the latest run are kept in self.stats.
+        :param t: (T) integration time grid, dt = t[1] - t[0]
+        :param phi0: (N) or (B x N) initial phases
+        :param method: integration method
+        :param stride: yield every stride-th step, i.e. the frames at t[::stride]
+        :param verbose: print the current time step
+        :param rtol: relative tolerance of adaptive methods
+        :param atol: absolute tolerance of adaptive methods
+        :param omega0: initial angular velocities of the second-order model, zero by default
+        :param state: yield the (2 x ...) block of phases and velocities of the second-order model
+        :param rng: numpy.random.Generator or seed for the noise, the global numpy.random state by default
+        :param monitor: monitor.Monitor timing the run and reporting its progress
+        :return: generator of (time, phases shaped like phi0)
+        """
+        if method not in self._methods:
             raise ValueError('Invalid method. Expected one of: {}'.format(self._methods))
+        if method == 'dopri5' and np.any(self._noise):
+            raise ValueError('Adaptive methods require noise=0.')
+        inertia = self._second_order
+        if method == 'verlet' and not np.all(inertia):
+            raise ValueError('Method verlet requires second_order > 0.')
+
+        def dpdt(y, work):
+            # deterministic derivative; second order: y = (phi, omega) as one contiguous block
+            if not np.any(inertia):
+                return self.drift(y, work=work)
+            dy = np.empty_like(y)
+            dy[0] = y[1]
+            dy[1] = (self.drift(y[0], work=work) - self._damping * y[1]) / inertia
+            return dy
+
+        def wrap(y):
+            if np.any(inertia):
+                y[0] %= 2 * np.pi
+            else:
+                y %= 2 * np.pi
+            return y
+
+        def apply_control(y, time):
+            with timers[1]:
+                self.control(y[0] if np.any(inertia) else y, time)
+            return y
+
+        def frame(y):
+            return y if state or not np.any(inertia) else y[0]
+
+        monitor = self._monitor(verbose, monitor)
+        timers = (nullcontext(), nullcontext()) if monitor is None else \
+            (monitor.phase('derivative'), monitor.phase('control'))
+
+        def frames():
+            stepper = Stepper(self, phi0, t[1] - t[0], method=method, rng=rng, time=t[0], omega0=omega0,
+                              monitor=monitor)
+            if monitor is not None:
+                monitor.start(t)
+            try:
+                yield t[0], frame(stepper.y).copy()
+                for time in self._advance(stepper, t, stride, monitor):
+                    yield time, frame(stepper.y).copy()
+            finally:
+                if monitor is not None:
+                    monitor.finish()
+
+        def rms(x, scale):
+            return np.sqrt(np.mean((x / scale) ** 2))
+
+        def adaptive():
+            if monitor is not None:
+                monitor.start(t[::stride])
+            try:
+                yield from integrate()
+            finally:
+                if monitor is not None:
+                    monitor.finish()
+
+        def integrate():
+            work = self.workspace(np.shape(phi0))
+
+            def f(y):
+                self.stats['evaluations'] += 1
+                with timers[0]:
+                    return dpdt(y, work)
+
+            out = t[::stride]
+            y0 = np.array(phi0, dtype=self._dtype)
+            if np.any(inertia):
+                y0 = np.stack([y0, np.zeros_like(y0) if omega0 is None else np.broadcast_to(omega0, y0.shape)])
+            yield out[0], frame(y0)
+            k = np.empty((7,) + y0.shape, dtype=self._dtype)
+            k[0] = f(y0)
+
+            # initial step from the scale of the solution and its derivatives (Hairer & Wanner II.4)
+            scale = atol + rtol * np.abs(y0)
+            d0, d1 = rms(y0, scale), rms(k[0], scale)
+            h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+            d2 = rms(f(y0 + h0 * k[0]) - k[0], scale) / h0
+            h1 = max(1e-6, 1e-3 * h0) if max(d1, d2) <= 1e-15 else (0.01 / max(d1, d2)) ** (1 / 5)
+            h = min(100 * h0, h1, out[-1] - out[0])
+
+            t0, j = out[0], 1
+            while j < len(out):
+                last = h >= out[-1] - t0
+                if last:
+                    h = out[-1] - t0
+                for i in range(1, 6):
+                    k[i] = f(y0 + h * np.tensordot(_DP_A[i], k[:i], axes=1))
+                y1 = (y0 + h * np.tensordot(_DP_B, k[:6], axes=1)).astype(self._dtype, copy=False)
+                k[6] = f(y1)
+                err = rms(h * np.tensordot(_DP_E, k, axes=1), atol + rtol * np.maximum(np.abs(y0), np.abs(y1)))
+
+                if err <= 1:
+                    self.stats['accepted'] += 1
+                    t1 = out[-1] if last else t0 + h
+                    q = np.tensordot(_DP_P.T, k, axes=1)
+                    while j < len(out) and out[j] <= t1:
+                        theta = (out[j] - t0) / h
+                        y = wrap((y0 + h * np.tensordot(theta ** np.arange(1, 5), q, axes=1)).astype(self._dtype))
+                        if self._control is not None:
+                            y = apply_control(y, out[j])
+                        yield out[j], frame(y)
+                        j += 1
+                    if monitor is not None:
+                        monitor.update(self.stats['accepted'], t1)
+                    y0 = wrap(y1)
+                    if self._control is not None:
+                        y0 = apply_control(y0, t1)
+                        k[0] = f(y0)
+                    else:
+                        k[0] = k[6]
+                    t0 = t1
+                    factor = 10 if err == 0 else min(10, 0.9 * err ** -0.2)
+                else:
+                    self.stats['rejected'] += 1
+                    factor = max(0.2, 0.9 * err ** -0.2)
+                h *= factor
+                if h <= 10 * np.spacing(t0):
+                    raise RuntimeError('Step size underflow at t = {}.'.format(t0))
+
+        self.stats = {'accepted': 0, 'rejected': 0, 'evaluations': 0}
+        if method == 'dopri5':
+            return adaptive()
+        return frames()
+
+    def _monitor(self, verbose, monitor):
+        # verbose runs print their progress through a monitor, throttled to ten lines per second
+        if verbose and monitor is None:
+            return Monitor(interval=0.1)
+        return monitor
+
+    def _advance(self, stepper, t, stride, monitor):
+        # steps from the current step of the stepper to the end of t, yielding the time of every stride-th step
+        for i in range(stepper.steps, len(t) - 1):
+            stepper.step()
+            if monitor is not None:
+                monitor.update(i + 1, t[i + 1])
+            if (i + 1) % stride == 0:
+                yield t[i + 1]
+
+    def _observe(self, step, time, phi, observers, stop):
+        # feeds the observers due at this step, True once the stop condition holds
+        due = False
+        for observer in observers:
+            if step % observer.every == 0:
+                observer(time, phi)
+                due = True
+        return due and stop is not None and stop()
+
+    def _record(self, stepper, t, sink, run, observers, stop, monitor):
+        # fixed-step evolve that snapshots the stepper, the frame count and the observations every run['every'] steps
+        last = stepper.steps
+        recording = nullcontext() if monitor is None else monitor.phase('recording')
+        if monitor is not None:
+            monitor.start(t, stepper.steps)
+        try:
+            for time in self._advance(stepper, t, 1, monitor):
+                with recording:
+                    phi = stepper.y if run['state'] or not np.any(self._second_order) else stepper.y[0]
+                    recorded = stepper.steps % run['stride'] == 0
+                    if recorded:
+                        sink.append(phi)
+                    if self._observe(stepper.steps, time, phi, observers, stop):
+                        break
+                    if recorded and stepper.steps - last >= run['every']:
+                        sink.flush()
+                        observed = [observer.state() for observer in observers]
+                        steppers.save(run['checkpoint'], dict(stepper.get_state(), frames=sink.frames,
+                                                              stats=self.stats, observed=observed, N=self._N,
+                                                              T=len(t), **run))
+                        last = stepper.steps
+        finally:
+            if monitor is not None:
+                monitor.finish()
+        return sink.close()
+
+    def evolve(self, t, phi0, method='rk4', verbose=False, stride=1, sink=None, rtol=1e-3, atol=1e-6,
+               omega0=None, state=False, rng=None, observers=(), stop=None, checkpoint=None, checkpoint_every=1000,
+               monitor=None):
+        """
+        :param t: (T) integration time grid, dt = t[1] - t[0]; output grid of adaptive methods
+        :param phi0: (N) or (B x N) initial phases
+        :param method: one of 'forward_euler', 'rk4', the adaptive 'dopri5', the stochastic
+                       'euler_maruyama' and 'heun', or, for the second-order model, the damped
+                       symplectic 'verlet'. The stochastic methods treat noise as a diffusion
+                       noise * pi * dW, the others add noise * pi to every derivative evaluation
+        :param verbose: print the current time step
+        :param stride: record every stride-th step, i.e. the frames at t[::stride]
+        :param sink: sinks.Sink receiving the frames in chunks, in memory by default;
+                     stored in the precision of the model unless the sink sets its own dtype
+        :param rtol: relative tolerance of adaptive methods
+        :param atol: absolute tolerance of adaptive methods
+        :param omega0: initial angular velocities of the second-order model, zero by default
+        :param state: record phases and velocities of the second-order model as (2 x ...) frames
+        :param rng: numpy.random.Generator or seed for the noise, the global numpy.random state by default
+        :param observers: observers.Observer reductions evaluated on the fly, every observer.every steps
+        :param stop: function of no arguments ending the run once it returns True, checked whenever an
+                     observer was updated, e.g. observers.Steady(observer, window, tol)
+        :param checkpoint: file receiving the integrator state of fixed-step methods, continued by resume
+        :param checkpoint_every: (int) steps between checkpoints, rounded up to a recorded frame
+        :param monitor: monitor.Monitor timing derivative evaluations, control and recording, reporting
+                        steps per second and the remaining time; verbose prints its progress line
+        :return: (T / stride x ...) recorded phases as returned by the sink, up to the stop
+        """
+        if checkpoint is not None and method == 'dopri5':
+            raise ValueError('Checkpoints require a fixed-step method.')
+        every = 1 if observers else stride
+        monitor = self._monitor(verbose, monitor)
+        frames = self.iterate(t, phi0, method=method, stride=every, verbose=verbose, rtol=rtol, atol=atol,
+                              omega0=omega0, state=state, rng=rng, monitor=monitor)
+        for observer in observers:
+            observer.reset()
+        shape = np.shape(phi0)
+        if state and np.any(self._second_order):
+            shape = (2,) + shape
+        if sink is None:
+            sink = sinks.Array()
+        sink.open((len(range(0, len(t), stride)),) + shape, dtype=self._dtype)
+        if checkpoint is not None:
+            stepper = Stepper(self, phi0, t[1] - t[0], method=method, rng=rng, time=t[0], omega0=omega0,
+                              monitor=monitor)
+            phi = stepper.y if state or not np.any(self._second_order) else stepper.y[0]
+            sink.append(phi)
+            run = {'stride': stride, 'state': state, 'verbose': verbose, 'shape': shape,
+                   'checkpoint': checkpoint, 'every': checkpoint_every}
+            if self._observe(0, t[0], phi, observers, stop):
+                return sink.close()
+            return self._record(stepper, t, sink, run, observers, stop, monitor)
+        recording = nullcontext() if monitor is None else monitor.phase('recording')
+        for i, (time, phi) in enumerate(frames):
+            with recording:
+                if i * every % stride == 0:
+                    sink.append(phi)
+                if self._observe(i * every, time, phi, observers, stop):
+                    break
+        frames.close()
+        return sink.close()
+
+    def resume(self, checkpoint, t, sink=None, verbose=False, observers=(), stop=None, monitor=None):
+        """
+        Continue an evolve run from its last checkpoint, bit-identical to the uninterrupted run.
+        The model must be constructed as for the original run; control is a function of time,
+        so it is restored with the step index.
+        :param checkpoint: file written by evolve, updated as the run continues
+        :param t: (T) integration time grid of the original run
+        :param sink: sink of the original run; file sinks are reopened and extended,
+                     in-memory sinks receive the frames after the checkpoint only
+        :param verbose: print the current time step
+        :param observers: observers of the original run, refilled with the observations up to the checkpoint
+        :param stop: stop condition of the original run
+        :param monitor: monitor.Monitor of the continued run
+        :return: recorded phases as returned by the sink
+        """
+        saved = steppers.load(checkpoint)
+        if saved['N'] != self._N or saved['T'] != len(t) or saved['dt'] != t[1] - t[0]:
+            raise ValueError('Checkpoint {} does not match the model or time grid.'.format(checkpoint))
+        phi0 = saved['y'][0] if np.any(self._second_order) else saved['y']
+        monitor = self._monitor(verbose, monitor)
+        stepper = Stepper(self, phi0, saved['dt'], method=saved['method'], time=saved['time'], monitor=monitor)
+        stepper.set_state(saved)
+        self.stats = saved['stats']
+        if len(observers) != len(saved['observed']):
+            raise ValueError('Checkpoint {} holds {} observers.'.format(checkpoint, len(saved['observed'])))
+        for observer, (times, values) in zip(observers, saved['observed']):
+            observer.reset(times, values)
+        run = {k: saved[k] for k in ['stride', 'state', 'shape', 'every']}
+        run.update(checkpoint=checkpoint, verbose=verbose)
+        if sink is None:
+            sink = sinks.Array()
+        sink.open((len(range(0, len(t), run['stride'])),) + tuple(run['shape']), dtype=self._dtype,
+                  start=saved['frames'])
+        return self._record(stepper, t, sink, run, observers, stop, monitor)
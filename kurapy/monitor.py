@@ -0,0 +1,113 @@
+import cProfile
+import pstats
+import sys
+import time
+import tracemalloc
+
+
+def progress(report):
+    # the line verbose=True prints, overwritten in place
+    sys.stdout.flush()
+    sys.stdout.write('\rTime: {:.2f}/{:.2f}  {:.0f} steps/s  ETA {:.1f} s'.format(
+        report['time'], report['end'], report['rate'], report['eta']))
+
+
+class _Phase:
+    # reusable context manager adding the time spent inside it to one phase
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timers[self.name] += time.perf_counter() - self.start
+
+
+class Monitor:
+    def __init__(self, callback=progress, interval=1.0, profile=None):
+        """
+        Instruments a Model.evolve or Model.resume run: time spent in derivative evaluations (the coupling),
+        control and recording (sink, observers, checkpoints), steps per second and the remaining time.
+        Without a monitor evolve does none of this bookkeeping.
+        :param callback: function of the report dict, called at most every interval seconds and once at the end
+        :param interval: seconds between callbacks
+        :param profile: None, 'cprofile' or 'tracemalloc' capture around the run, kept as pstats.Stats
+                        in self.stats or as the peak traced bytes in self.peak and a snapshot in self.snapshot
+        """
+        self._profiles = [None, 'cprofile', 'tracemalloc']
+        if profile not in self._profiles:
+            raise ValueError('Invalid profile. Expected one of: {}'.format(self._profiles))
+        self.callback = callback
+        self.interval = interval
+        self.profile = profile
+        self.timers = {}
+
+    def phase(self, name):
+        """
+        :param name: 'derivative', 'control' or 'recording'
+        :return: reusable context manager adding the time spent inside it to the phase, timing the caller's own calls
+        """
+        return _Phase(self.timers, name)
+
+    def start(self, t, step=0):
+        """
+        :param t: (T) time grid of the run
+        :param step: steps already taken, e.g. by a resumed run
+        """
+        # cleared in place, phases handed out before the run keep adding to the same timers
+        self.timers.clear()
+        self.timers.update(derivative=0.0, control=0.0, recording=0.0)
+        self._t = (t[0], t[-1], len(t) - 1)
+        self._first = step
+        self.report = dict(step=step, steps=len(t) - 1, time=t[0], end=t[-1], fraction=0.0, elapsed=0.0, rate=0.0,
+                           eta=float('nan'), phases=self.timers)
+        if self.profile == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.profile == 'tracemalloc':
+            tracemalloc.start()
+        self._start = self._last = time.perf_counter()
+
+    def update(self, step, now):
+        """
+        Count a step reaching time now; calls back once interval seconds passed since the last call.
+        :param step: steps taken, or accepted steps of adaptive methods
+        :param now: integration time reached
+        """
+        self.report['step'], self.report['time'] = step, now
+        clock = time.perf_counter()
+        if self.callback is not None and clock - self._last >= self.interval:
+            self._last = clock
+            self.callback(self._summarise(clock))
+
+    def _summarise(self, clock):
+        t0, t1, steps = self._t
+        report = self.report
+        report['elapsed'] = clock - self._start
+        report['fraction'] = (report['time'] - t0) / (t1 - t0) if t1 > t0 else 1.0
+        report['rate'] = (report['step'] - self._first) / max(report['elapsed'], 1e-12)
+        # the remaining time extrapolated from the integration time covered so far, which adaptive steps also advance
+        done = report['fraction'] - self._first / max(steps, 1)
+        report['eta'] = report['elapsed'] * (1 - report['fraction']) / done if done > 0 else float('nan')
+        report['phases'] = dict(self.timers, other=report['elapsed'] - sum(self.timers.values()))
+        return report
+
+    def finish(self):
+        """
+        End the run: stops the capture and calls back with the final report.
+        :return: report dict with step, steps, time, end, fraction, elapsed, rate, eta and phases (seconds)
+        """
+        clock = time.perf_counter()
+        if self.profile == 'cprofile':
+            self._profiler.disable()
+            self.stats = pstats.Stats(self._profiler)
+        elif self.profile == 'tracemalloc':
+            self.peak = tracemalloc.get_traced_memory()[1]
+            self.snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        report = self._summarise(clock)
+        if self.callback is not None:
+            self.callback(report)
+        return report
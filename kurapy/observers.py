@@ -0,0 +1,77 @@
+import numpy as np
+
+
+def order(phi):
+    # global order parameter R per member
+    return np.abs(np.mean(np.exp(1j * phi), axis=-1))
+
+
+class Observer:
+    def __init__(self, fn=order, every=1):
+        """
+        Reduces the phases on the fly during Model.evolve, keeping only the reduced values.
+        :param fn: maps (N) or (B x N) phases to values, global order parameter R by default
+        :param every: (int) observe every every-th step
+        """
+        self.fn = fn
+        self.every = every
+        self.reset()
+
+    def __call__(self, time, phi):
+        self._times.append(time)
+        self._values.append(self.fn(phi))
+
+    def state(self):
+        # (times, values) observed so far, restored by reset
+        return list(self._times), list(self._values)
+
+    def reset(self, times=(), values=()):
+        self._times = list(times)
+        self._values = list(values)
+
+    def last(self, n=1):
+        # the latest n values, fewer early in the run; stop conditions read these instead of all values
+        return np.array(self._values[-n:])
+
+    @property
+    def times(self):
+        return np.array(self._times)
+
+    @property
+    def values(self):
+        return np.array(self._values)
+
+
+class Steady:
+    def __init__(self, observer, window, tol):
+        """
+        Stop condition met once the observed values vary by less than tol over the last window observations.
+        Values of several members must all be steady.
+        :param observer: Observer passed to Model.evolve
+        :param window: (int) observations compared
+        :param tol: largest change still considered steady
+        """
+        self.observer = observer
+        self.window = window
+        self.tol = tol
+
+    def __call__(self):
+        values = self.observer.last(self.window)
+        if len(values) < self.window:
+            return False
+        return bool(np.all(np.ptp(values, axis=0) < self.tol))
+
+
+class Reached:
+    def __init__(self, observer, value):
+        """
+        Stop condition met once every observed value is at least value, e.g. R >= 0.99 for synchrony.
+        :param observer: Observer passed to Model.evolve
+        :param value: threshold
+        """
+        self.observer = observer
+        self.value = value
+
+    def __call__(self):
+        values = self.observer.last()
+        return len(values) > 0 and bool(np.all(values[-1] >= self.value))
@@ -0,0 +1,308 @@
+import json
+import os
+import numpy as np
+
+_levels = 2 ** 16  # quantisation steps of 2 pi / 65536 rad
+
+
+class Sink:
+    def __init__(self, chunk=64, dtype=None):
+        """
+        Receives trajectory frames from Model.evolve and stores them in chunks.
+        Subclasses provide the storage through _allocate.
+        :param chunk: (int) frames buffered in memory between writes
+        :param dtype: storage type of the phases, the precision of the model by default
+        """
+        self.chunk = chunk
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.data = None
+        self._buffer = None
+        self._count = 0
+        self._index = 0
+
+    def _allocate(self, shape):
+        raise NotImplementedError
+
+    def _reopen(self, shape):
+        raise NotImplementedError('{} cannot be resumed.'.format(type(self).__name__))
+
+    def open(self, shape, dtype=np.float64, start=0):
+        """
+        :param shape: (frames, ...) of the full trajectory
+        :param dtype: type of the frames, used unless the sink was given its own
+        :param start: frames already stored by an earlier run, which is continued
+        """
+        if self.dtype is None:
+            self.dtype = np.dtype(dtype)
+        self.data = self._allocate(shape) if start == 0 else self._reopen(shape)
+        self._buffer = np.empty((max(1, min(self.chunk, shape[0])),) + tuple(shape[1:]), dtype=self.dtype)
+        self._count = 0
+        self._index = start
+
+    @property
+    def frames(self):
+        # frames of the trajectory stored so far, including those of a continued run; checkpoints record it
+        return self._index
+
+    def append(self, frame):
+        self._buffer[self._count] = frame
+        self._count += 1
+        if self._count == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        self.data[self._index:self._index + self._count] = self._buffer[:self._count]
+        self._index += self._count
+        self._count = 0
+
+    def close(self):
+        self.flush()
+        self._buffer = None
+        return self.data[:self._index]
+
+
+class Array(Sink):
+    # in-memory trajectory, frames are written directly without buffering
+    _start = 0
+
+    def _allocate(self, shape):
+        return np.zeros(shape, dtype=self.dtype)
+
+    def open(self, shape, dtype=np.float64, start=0):
+        # a resumed run only holds the frames after start
+        if self.dtype is None:
+            self.dtype = np.dtype(dtype)
+        self.data = self._allocate((shape[0] - start,) + tuple(shape[1:]))
+        self._index = 0
+        self._start = start
+
+    @property
+    def frames(self):
+        return self._start + self._index
+
+    def append(self, frame):
+        self.data[self._index] = frame
+        self._index += 1
+
+    def flush(self):
+        pass
+
+
+class Memmap(Sink):
+    def __init__(self, filename, chunk=64, dtype=None):
+        """
+        Raw binary trajectory written through numpy.memmap.
+        :param filename: output file, read back with np.memmap(filename, dtype, shape=...);
+                         a run ended by a stop condition keeps only the frames stored up to it
+        """
+        super().__init__(chunk=chunk, dtype=dtype)
+        self.filename = filename
+
+    def _allocate(self, shape):
+        return np.memmap(self.filename, dtype=self.dtype, mode='w+', shape=shape)
+
+    def _reopen(self, shape):
+        return np.memmap(self.filename, dtype=self.dtype, mode='r+', shape=shape)
+
+    def flush(self):
+        super().flush()
+        self.data.flush()
+
+    def close(self):
+        data = super().close()
+        if self._index == len(self.data):
+            return data
+        # a stopped run: the preallocated frames after the last stored one are cut from the file
+        offset, shape = self.data.offset, (self._index,) + self.data.shape[1:]
+        self.data = data = None
+        self._truncate(offset, shape)
+        self.data = self._reopen(shape)
+        return self.data
+
+    def _truncate(self, offset, shape):
+        os.truncate(self.filename, offset + int(np.prod(shape)) * self.dtype.itemsize)
+
+
+class Npy(Memmap):
+    # .npy trajectory, read back with np.load(filename, mmap_mode='r')
+    def _allocate(self, shape):
+        return np.lib.format.open_memmap(self.filename, mode='w+', dtype=self.dtype, shape=shape)
+
+    def _reopen(self, shape):
+        data = np.lib.format.open_memmap(self.filename, mode='r+')
+        if data.shape != tuple(shape) or data.dtype != self.dtype:
+            raise ValueError('File {} does not match the trajectory.'.format(self.filename))
+        return data
+
+    def _truncate(self, offset, shape):
+        # the header is rewritten in place, padded to its old length, which the shorter shape always fits
+        with open(self.filename, 'r+b') as f:
+            version = np.lib.format.read_magic(f)
+            start = f.tell() + (2 if version == (1, 0) else 4)
+            header = repr({'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                           'shape': tuple(shape)})
+            f.seek(start)
+            f.write(header.ljust(offset - start - 1).encode('latin1') + b'\n')
+        super()._truncate(offset, shape)
+
+
+def _quantise(phi):
+    return np.remainder(np.rint(np.asarray(phi, dtype=np.float64) * (_levels / (2 * np.pi))), _levels).astype(np.uint16)
+
+
+class Quantised(Sink):
+    def __init__(self, filename, chunk=256, compress=False, meta=None):
+        """
+        Directory of phases quantised to uint16 steps of 2 pi / 65536, within 5e-5 rad, a quarter of float64.
+        Every chunk of frames is one .npy file, read back lazily by Trajectory(filename).
+        Only phases can be stored, not the velocities of the second-order model.
+        :param filename: output directory
+        :param chunk: (int) frames per file
+        :param compress: zlib-compress the chunks as differences between frames; such chunks are decoded
+                         whole instead of memory-mapped
+        :param meta: JSON-serialisable description stored alongside, e.g. L, t and model parameters
+        """
+        super().__init__(chunk=chunk)
+        self.filename = filename
+        self.compress = compress
+        self.meta = meta
+
+    def _path(self, i, compress):
+        return os.path.join(self.filename, 'chunk{:06d}.{}'.format(i, 'npz' if compress else 'npy'))
+
+    def _write_meta(self):
+        info = {'shape': self._shape, 'frames': self._index, 'chunks': self._chunks, 'compress': self._compressed,
+                'meta': self.meta}
+        tmp = os.path.join(self.filename, 'meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(info, f, default=lambda o: o.tolist())
+        os.replace(tmp, os.path.join(self.filename, 'meta.json'))
+
+    def _allocate(self, shape):
+        os.makedirs(self.filename, exist_ok=True)
+        for name in os.listdir(self.filename):
+            if name.startswith('chunk'):
+                os.remove(os.path.join(self.filename, name))
+        self._shape, self._chunks, self._compressed = list(shape), [], []
+        self._index = 0
+        self._write_meta()
+
+    def _reopen(self, shape):
+        with open(os.path.join(self.filename, 'meta.json')) as f:
+            info = json.load(f)
+        if info['shape'] != list(shape):
+            raise ValueError('File {} does not match the trajectory.'.format(self.filename))
+        self._shape, self._chunks, self._compressed = info['shape'], info['chunks'], info['compress']
+        if self.meta is None:
+            self.meta = info['meta']
+
+    def open(self, shape, dtype=np.float64, start=0):
+        super().open(shape, dtype=dtype, start=start)
+        if start > 0:
+            # chunks written after the checkpoint are dropped, one straddling it is cut
+            reader = Trajectory(self.filename)
+            offsets = np.cumsum([0] + self._chunks)
+            keep = int(np.searchsorted(offsets, start, side='right')) - 1
+            if offsets[keep] < start:
+                q = reader._chunk(keep)[:start - offsets[keep]]
+                self._chunks[keep] = len(q)
+                self._save(keep, q, self._compressed[keep])
+                keep += 1
+            for i in range(keep, len(self._chunks)):
+                os.remove(self._path(i, self._compressed[i]))
+            self._chunks, self._compressed = self._chunks[:keep], self._compressed[:keep]
+            self._write_meta()
+
+    def _save(self, i, q, compress):
+        if compress:
+            np.savez_compressed(self._path(i, True), q=np.diff(q, axis=0, prepend=np.zeros_like(q[:1])))
+        else:
+            np.save(self._path(i, False), q)
+
+    def flush(self):
+        if self._count == 0:
+            return
+        self._save(len(self._chunks), _quantise(self._buffer[:self._count]), self.compress)
+        self._chunks.append(self._count)
+        self._compressed.append(self.compress)
+        self._index += self._count
+        self._count = 0
+        self._write_meta()
+
+    def close(self):
+        self.flush()
+        self._buffer = None
+        return Trajectory(self.filename)
+
+
+class Trajectory:
+    def __init__(self, filename, dtype=np.float64, grid=None):
+        """
+        Lazy reader of a Quantised trajectory. Indexing along time loads only the chunks it touches,
+        memory-mapped unless compressed, so it can be passed as phases to analyze and visualize functions.
+        :param filename: directory written by Quantised
+        :param dtype: type of the decoded phases
+        :param grid: (rows, cols) to return frames as matrices like analyze.shape_matrix, see matrix
+        """
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.grid = grid
+        with open(os.path.join(filename, 'meta.json')) as f:
+            info = json.load(f)
+        self.meta = info['meta']
+        self._chunks = info['chunks']
+        self._compressed = info['compress']
+        self._offsets = np.cumsum([0] + self._chunks)
+        self._frame = tuple(info['shape'][1:])
+        frame = self._frame if grid is None else self._frame[:-1] + (grid[1], grid[0])
+        self.shape = (int(self._offsets[-1]),) + frame
+        self._decoded = (None, None)
+
+    def matrix(self, shape=None):
+        """
+        :param shape: (rows, cols) of a rectangular grid, square by default
+        :return: reader of (T x rows x cols) frames, as analyze.shape_matrix of the phases
+        """
+        if shape is None:
+            dd = int(np.sqrt(self.shape[-1]))
+            shape = (dd, dd)
+        return Trajectory(self.filename, dtype=self.dtype, grid=shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def _chunk(self, i):
+        # quantised frames of chunk i; a compressed chunk is kept decoded while it is read. The cache is
+        # read once into a local, so threads replacing it meanwhile never hand out another chunk
+        if not self._compressed[i]:
+            return np.load(os.path.join(self.filename, 'chunk{:06d}.npy'.format(i)), mmap_mode='r')
+        decoded = self._decoded
+        if decoded[0] != i:
+            with np.load(os.path.join(self.filename, 'chunk{:06d}.npz'.format(i))) as data:
+                decoded = (i, np.cumsum(data['q'], axis=0, dtype=np.uint16))
+            self._decoded = decoded
+        return decoded[1]
+
+    def __getitem__(self, index):
+        index = index if isinstance(index, tuple) else (index,)
+        frames = np.arange(len(self))[index[0]]
+        single = np.ndim(frames) == 0
+        frames = np.atleast_1d(frames)
+        q = np.empty((len(frames),) + self._frame, dtype=np.uint16)
+        chunk = np.searchsorted(self._offsets, frames, side='right') - 1
+        for i in np.unique(chunk):
+            mask = chunk == i
+            q[mask] = self._chunk(i)[frames[mask] - self._offsets[i]]
+        phi = q.astype(self.dtype) * self.dtype.type(2 * np.pi / _levels)
+        if self.grid is not None:
+            rows, cols = self.grid
+            phi = phi.reshape(phi.shape[:-1] + (rows, cols)).swapaxes(-1, -2)
+        return phi[0][index[1:]] if single else phi[(slice(None),) + index[1:]]
+
+    def __array__(self, dtype=None, copy=None):
+        phi = self[:]
+        return phi if dtype is None else phi.astype(dtype)
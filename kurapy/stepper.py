@@ -0,0 +1,274 @@
+from contextlib import nullcontext
+import json
+import os
+import numpy as np
+
+
+def streams(seed, n):
+    """
+    Independent, reproducible noise streams, e.g. one per worker or ensemble member.
+    :param seed: (int) root seed
+    :param n: number of streams
+    :return: list of numpy.random.Generator
+    """
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n)]
+
+
+def save(filename, state):
+    """
+    Write a state dict atomically as .npz: arrays are stored as such, everything else as JSON.
+    The file is replaced only once the new one is complete, so an interrupted write keeps the old one.
+    :param filename: output file
+    :param state: dict of arrays and JSON-serialisable values, e.g. from Stepper.get_state
+    """
+    arrays = {k: v for k, v in state.items() if isinstance(v, np.ndarray)}
+    meta = {k: v for k, v in state.items() if k not in arrays}
+    tmp = '{}.tmp'.format(filename)
+    with open(tmp, 'wb') as f:
+        np.savez(f, _meta=np.array(json.dumps(meta, default=lambda o: o.tolist())), **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+
+def load(filename):
+    """
+    :param filename: file written by save
+    :return: state dict
+    """
+    with np.load(filename) as data:
+        state = json.loads(str(data['_meta']))
+        state.update({k: data[k] for k in data.files if k != '_meta'})
+    return state
+
+
+class Stepper:
+    def __init__(self, model, phi0, dt, method='rk4', rng=None, time=0, omega0=None, block=64, monitor=None):
+        """
+        Fixed-step integrator of a Model that owns its stage buffers and advances the state in place.
+        :param model: Model or Ensemble to integrate
+        :param phi0: (N) or (B x N) initial phases
+        :param dt: time step
+        :param method: 'forward_euler', 'rk4', the stochastic 'euler_maruyama' and 'heun',
+                       or, for the second-order model, 'verlet'
+        :param rng: numpy.random.Generator or seed for the noise, the global numpy.random state by default
+        :param time: initial time, passed to time-dependent control
+        :param omega0: initial angular velocities of the second-order model, zero by default
+        :param block: steps of noise drawn at once
+        :param monitor: monitor.Monitor timing the derivative evaluations and control of this stepper
+        """
+        stages = {'forward_euler': 1, 'rk4': 4, 'verlet': 1, 'euler_maruyama': 1, 'heun': 2}
+        if method not in stages:
+            raise ValueError('Invalid method. Expected one of: {}'.format(list(stages)))
+        inertia = model.second_order
+        if method == 'verlet' and not np.all(inertia):
+            raise ValueError('Method verlet requires second_order > 0.')
+
+        self.model = model
+        self.method = method
+        self.dt = dt
+        if rng is not None and not isinstance(rng, np.random.Generator):
+            rng = np.random.default_rng(rng)
+        self.rng = rng
+        self.time = time
+        self.steps = 0
+        self._t0 = time
+        self._inertia = np.any(inertia)
+        # stochastic methods draw one Wiener increment per step, the others one sample per evaluation
+        self._sde = method in ['euler_maruyama', 'heun']
+        self._block = block if self._sde else block * stages[method]
+
+        phi = np.array(phi0, dtype=model.dtype)
+        if self._inertia:
+            omega = np.zeros_like(phi) if omega0 is None else np.broadcast_to(omega0, phi.shape)
+            self.y = np.stack([phi, omega])
+        else:
+            self.y = phi
+        self._k = np.empty_like(self.y)
+        self._acc = np.empty_like(self.y)
+        self._tmp = np.empty_like(self.y)
+        self._scratch = np.empty_like(phi)
+        self._work = model.workspace(phi.shape)
+        self._timers = (nullcontext(), nullcontext()) if monitor is None else \
+            (monitor.phase('derivative'), monitor.phase('control'))
+
+        self._sigma = model.noise * np.pi
+        self._noisy = np.any(self._sigma)
+        if self._sde:
+            # dphi = f dt + sigma dW, or domega = (force - damping omega) / m dt + sigma / m dW
+            self._sigma = self._sigma * np.sqrt(dt) / (inertia if self._inertia else 1)
+        self._stages = stages[method]
+        self._noise = None
+        self._draw = 0
+        self._block_state = None  # generator state the current noise block was drawn from
+        self._fresh = False  # whether _acc[1] holds the force at the current state (verlet)
+
+        if method == 'verlet':
+            # half kicks integrate the damping exactly: omega -> decay * omega + gain * force
+            gamma = model.damping * np.ones_like(inertia, dtype=float)
+            self._decay = np.exp(-gamma * dt / (2 * inertia))
+            self._gain = np.where(gamma > 0, (1 - self._decay) / np.where(gamma > 0, gamma, 1), dt / (2 * inertia))
+
+    @property
+    def phi(self):
+        return self.y[0] if self._inertia else self.y
+
+    def _next_noise(self):
+        # one noise sample per derivative evaluation, drawn from the generator in blocks
+        if self._noise is None or self._draw == len(self._noise):
+            size = (self._block,) + self.phi.shape
+            self._block_state = self._random_state()
+            if self.rng is None:
+                self._noise = np.random.normal(0, 1, size=size)
+            elif self._noise is None:
+                self._noise = self.rng.standard_normal(size, dtype=self.y.dtype)
+            else:
+                self.rng.standard_normal(out=self._noise, dtype=self._noise.dtype)
+            self._noise *= self._sigma
+            self._draw = 0
+        self._draw += 1
+        return self._noise[self._draw - 1]
+
+    def _random_state(self):
+        if self.rng is None:
+            return np.random.get_state(legacy=False)
+        return self.rng.bit_generator.state
+
+    def get_state(self):
+        """
+        Snapshot of the integration, from which set_state continues bit-identically.
+        Noise is recorded as the generator state plus the position within the current block,
+        so the snapshot stays the size of the phases.
+        :return: dict of arrays and JSON-serialisable values
+        """
+        return {'method': self.method, 'dt': self.dt, 'time': self._t0, 'steps': self.steps,
+                'y': self.y.copy(), 'force': self._acc[1].copy() if self._fresh else None,
+                'generator': self.rng is not None, 'draw': None if self._noise is None else self._draw,
+                'rng': self._random_state() if self._noise is None else self._block_state}
+
+    def set_state(self, state):
+        """
+        Restore a snapshot taken by get_state. Without a generator this sets the global numpy.random state.
+        :param state: dict from get_state or load
+        """
+        if state['method'] != self.method or state['dt'] != self.dt or np.shape(state['y']) != self.y.shape:
+            raise ValueError('State does not match this stepper.')
+        self.y[...] = state['y']
+        self.steps = state['steps']
+        self._t0 = state['time']
+        self.time = self._t0 + self.steps * self.dt
+        if state['generator']:
+            self.rng = np.random.Generator(getattr(np.random, state['rng']['bit_generator'])())
+            self.rng.bit_generator.state = state['rng']
+        else:
+            self.rng = None
+            np.random.set_state(state['rng'])
+        self._noise = None
+        self._draw = 0
+        if state['draw'] is not None:
+            # redraw the current block from its generator state and skip the samples already used
+            self._next_noise()
+            self._draw = state['draw']
+        self._fresh = state.get('force') is not None
+        if self._fresh:
+            self._acc[1] = state['force']
+
+    def _force(self, phi, out):
+        with self._timers[0]:
+            self.model.drift(phi, out=out, work=self._work)
+        if self._noisy and not self._sde:
+            out += self._next_noise()
+        return out
+
+    def _derivative(self, y, out):
+        if not self._inertia:
+            return self._force(y, out)
+        out[0] = y[1]
+        self._force(y[0], out[1])
+        np.multiply(y[1], self.model.damping, out=self._scratch)
+        out[1] -= self._scratch
+        out[1] /= self.model.second_order
+        return out
+
+    def step(self):
+        """
+        Advance one time step.
+        :return: current state, phases or the (2 x ...) block of the second-order model
+        """
+        y, k, acc, tmp, dt = self.y, self._k, self._acc, self._tmp, self.dt
+
+        if self.method == 'forward_euler':
+            self._derivative(y, k)
+            k *= dt
+            y += k
+
+        elif self.method == 'rk4':
+            self._derivative(y, k)
+            acc[...] = k
+            np.multiply(k, 0.5 * dt, out=tmp)
+            tmp += y
+            self._derivative(tmp, k)
+            np.multiply(k, 2, out=tmp)
+            acc += tmp
+            np.multiply(k, 0.5 * dt, out=tmp)
+            tmp += y
+            self._derivative(tmp, k)
+            np.multiply(k, 2, out=tmp)
+            acc += tmp
+            np.multiply(k, dt, out=tmp)
+            tmp += y
+            self._derivative(tmp, k)
+            acc += k
+            acc *= dt / 6
+            y += acc
+
+        elif self._sde:
+            dw = self._next_noise() if self._noisy else 0
+            target = y[1] if self._inertia else y
+            self._derivative(y, k)
+            k *= dt
+            if self.method == 'heun':
+                # stochastic Heun: trapezoidal drift through an Euler-Maruyama predictor, same increment
+                np.add(y, k, out=tmp)
+                (tmp[1] if self._inertia else tmp)[...] += dw
+                self._derivative(tmp, acc)
+                acc *= dt
+                k += acc
+                k *= 0.5
+            y += k
+            target += dw
+
+        else:
+            force, kick = acc[1], self._scratch
+            if not self._fresh:
+                self._force(y[0], force)
+            y[1] *= self._decay
+            np.multiply(force, self._gain, out=kick)
+            y[1] += kick
+            np.multiply(y[1], dt, out=kick)
+            y[0] += kick
+            self._force(y[0], force)
+            y[1] *= self._decay
+            np.multiply(force, self._gain, out=kick)
+            y[1] += kick
+            self._fresh = True
+
+        np.remainder(self.phi, 2 * np.pi, out=self.phi)
+        self.steps += 1
+        self.time = self._t0 + self.steps * dt
+        if self.model.controlled:
+            with self._timers[1]:
+                self.model.control(self.phi, self.time)
+            self._fresh = False
+        self.model.stats['accepted'] += 1
+        self.model.stats['evaluations'] += self._stages
+        return self.y
+
+    def run(self, n):
+        """
+        Advance n time steps.
+        :return: current state
+        """
+        for _ in range(n):
+            self.step()
+        return self.y
@@ -0,0 +1,143 @@
+import itertools
+import json
+import os
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import scipy.sparse as sp
+from .ensemble import Ensemble
+
+parameters = ['scale', 'shift', 'noise']
+_worker = {}
+
+
+def _put(a, handles):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+    np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[...] = a
+    handles.append(shm)
+    return shm.name, a.shape, a.dtype.str
+
+
+def _get(spec, handles):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    handles.append(shm)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _share(coupling, handles):
+    # dense and sparse matrices go through shared memory, factored couplings are small enough to pickle
+    if isinstance(coupling, np.ndarray):
+        return 'dense', _put(coupling, handles)
+    if sp.issparse(coupling):
+        csr = sp.csr_matrix(coupling)
+        return 'sparse', ([_put(a, handles) for a in (csr.data, csr.indices, csr.indptr)], csr.shape)
+    return 'object', coupling
+
+
+def _attach(shared, handles):
+    kind, spec = shared
+    if kind == 'dense':
+        return _get(spec, handles)
+    if kind == 'sparse':
+        arrays, shape = spec
+        return sp.csr_matrix(tuple(_get(a, handles) for a in arrays), shape=shape, copy=False)
+    return spec
+
+
+def _init(config):
+    _worker.clear()
+    _worker.update(config)
+    _worker['handles'] = []
+    _worker['coupling'] = _attach(config['coupling'], _worker['handles'])
+
+
+def _point(task):
+    index, params = task
+    w = _worker
+    # the stream depends only on the seed and the point, not on the worker that runs it
+    rng = np.random.default_rng(None if w['seed'] is None else [w['seed'], index])
+    phi0 = w['phi0'] if w['phi0'] is not None else 2 * np.pi * rng.random(np.shape(w['freq'])[-1])
+    model = Ensemble(w['freq'], w['coupling'], control=w['control'], **params)
+    R = model.observe(w['t'], phi0[np.newaxis], method=w['method'], stride=w['stride'], rng=rng)[:, 0]
+    return index, float(np.mean(R[int(w['transient'] * len(R)):]))
+
+
+def _load(checkpoint, points):
+    done = {}
+    if checkpoint is None or not os.path.exists(checkpoint):
+        return done
+    with open(checkpoint, 'rb+') as f:
+        data = f.read()
+        f.truncate(data.rfind(b'\n') + 1)  # drop a partially written last line
+    for line in data.splitlines()[:data.count(b'\n')]:
+        if line.strip():
+            record = json.loads(line)
+            if record['index'] >= len(points) or record['params'] != points[record['index']]:
+                raise ValueError('Checkpoint {} does not match the parameter grid.'.format(checkpoint))
+            done[record['index']] = record['R']
+    return done
+
+
+def run(freq, coupling, t, grid, phi0=None, method='rk4', stride=1, transient=0.5, control=None,
+        processes=None, checkpoint=None, seed=None):
+    """
+    Time-averaged global order parameter over a parameter grid, fanned out across a process pool.
+    The coupling is placed in shared memory once and every point reports only its mean R.
+    :param freq: (N) natural oscillator frequencies
+    :param coupling: (N x N) dense or scipy.sparse coupling matrix, coupling.Kernel or coupling.LowRank
+    :param t: (T) integration time grid
+    :param grid: dict mapping 'scale', 'shift' or 'noise' to a list of values
+    :param phi0: (N) initial phases, uniformly random per point by default
+    :param method: integration method
+    :param stride: sample R every stride-th step
+    :param transient: fraction of the samples discarded before averaging
+    :param control: (rows x cols) control strength ranging from 0 to 1
+    :param processes: (int) worker processes, os.cpu_count() by default
+    :param checkpoint: file recording finished points, an interrupted sweep resumes from it
+    :param seed: (int) root seed of the per-point noise streams
+    :return: mean R shaped (len(values) for each grid parameter)
+    """
+    for name in grid:
+        if name not in parameters:
+            raise ValueError('Invalid parameter. Expected one of: {}'.format(parameters))
+    names = list(grid)
+    shape = tuple(len(grid[name]) for name in names)
+    points = [dict(zip(names, [float(v) for v in values])) for values in itertools.product(*grid.values())]
+
+    done = _load(checkpoint, points)
+    tasks = [(i, p) for i, p in enumerate(points) if i not in done]
+
+    handles = []
+    config = {'freq': freq, 't': t, 'phi0': phi0, 'method': method, 'stride': stride,
+              'transient': transient, 'control': control, 'seed': seed}
+    try:
+        config['coupling'] = _share(coupling, handles) if processes != 1 else ('object', coupling)
+        log = open(checkpoint, 'a') if checkpoint is not None else None
+        if processes == 1:
+            _init(config)
+            results = map(_point, tasks)
+            pool = None
+        else:
+            pool = mp.Pool(processes, initializer=_init, initargs=(config,))
+            results = pool.imap_unordered(_point, tasks)
+        try:
+            for index, R in results:
+                done[index] = R
+                if log is not None:
+                    log.write(json.dumps({'index': index, 'params': points[index], 'R': R}) + '\n')
+                    log.flush()
+                    os.fsync(log.fileno())
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            if log is not None:
+                log.close()
+    finally:
+        _worker.clear()
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+
+    return np.array([done[i] for i in range(len(points))]).reshape(shape)